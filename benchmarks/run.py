@@ -0,0 +1,242 @@
+"""Benchmark suite of the fetch and browse hot paths.
+
+Every benchmark runs against a local stand-in of Star Wars API (see
+``swapi.py``) serving synthetic people, for each of the requested sizes:
+
+* ``people_table``: iteration over ``PeopleTable`` (fetching all pages),
+* ``transform``: ``transform_extracted_people_table()`` of extracted rows,
+* ``transform_fused`` and ``transform_chained``: the fused transform and
+  the chained petl transforms it replaces, with planets resolved in memory,
+  so only the transform itself is measured,
+* ``fetch_table_csv``: the whole fetch pipeline into a CSV file,
+* ``details``: the ``details`` view, for several aggregation, sort and
+  pagination parameters.
+
+Results are printed (or written to a file) as JSON, so they can be compared
+between revisions. Throughput is reported in rows per second, except for
+``details``, which is reported in requests per second.
+
+Usage::
+
+    python benchmarks/run.py [--sizes 100 1000 10000] [--repeat 3]
+        [--output results.json]
+
+"""
+import argparse
+import json
+import os
+import pathlib
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'web.settings.testing')
+
+import django  # noqa: E402
+
+django.setup()
+
+import petl  # noqa: E402
+from django.core.cache import caches  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from starwars.client import StarWarsClient  # noqa: E402
+from starwars.models import Dataset  # noqa: E402
+from starwars.services import fetch_table_csv, save_dataset_file  # noqa: E402
+from starwars.tables import PeopleTable  # noqa: E402
+from starwars.transforms import (  # noqa: E402
+    PEOPLE_CUTOUT_COLUMNS,
+    datetime_string_to_date_string,
+    get_planet_name,
+    transform_extracted_people_table,
+)
+
+from swapi import SwapiServer  # noqa: E402
+
+DETAILS_PARAMETERS = [
+    {},
+    {'order_by': 'name'},
+    {'order_by': '-height'},
+    {'order_by': 'mass', 'offset': 500},
+    {'field': 'homeworld'},
+    {'field': ['homeworld', 'gender'], 'order_by': '-count'},
+    {'field': 'eye_color', 'order_by': 'eye_color', 'limit': 100},
+]
+
+
+class PlanetClient:
+    """In-memory stand-in of ``StarWarsClient`` returning planets."""
+
+    def __enter__(self) -> 'PlanetClient':
+        return self
+
+    def __exit__(self, exc_type, exc_val, traceback):
+        pass
+
+    def get(self, url: str, **kwargs) -> Dict:
+        return {'name': f'Planet {url.rstrip("/").rsplit("/", 1)[-1]}'}
+
+
+def chained_transform(table: petl.Table, client) -> petl.Table:
+    """Chained petl transforms replaced by the fused transform."""
+    table = petl.addfield(
+        table,
+        'date',
+        lambda row: datetime_string_to_date_string(row.get('edited', None)),
+        missing=None,
+    )
+    table = petl.convert(
+        table,
+        'homeworld',
+        lambda value: get_planet_name(client, value)
+    )
+    return petl.cutout(table, *PEOPLE_CUTOUT_COLUMNS)
+
+
+def clear_caches():
+    for alias in ('planets', 'datasets'):
+        caches[alias].clear()
+
+
+def measure(
+    run: Callable[[], int],
+    repeat: int,
+    unit: str = 'rows'
+) -> Dict:
+    """Run a benchmark several times and keep the best time.
+
+    Args:
+        run: Callable running the benchmark once and returning the number
+            of processed units (e.g. rows).
+        repeat: Number of runs.
+        unit: Name of the units counted by ``run``.
+
+    Returns:
+        Best time in seconds, and units per second of the best run.
+
+    """
+    times = []
+    count = 0
+    for _ in range(repeat):
+        clear_caches()
+        time_start = time.perf_counter()
+        count = run()
+        times.append(time.perf_counter() - time_start)
+    best = min(times)
+    return {
+        'seconds': best,
+        'mean_seconds': sum(times) / len(times),
+        unit: count,
+        f'{unit}_per_second': count / best if best else None,
+    }
+
+
+def benchmark_size(server: SwapiServer, repeat: int) -> List[Dict]:
+    results = []
+    client = StarWarsClient()
+
+    def record(
+        name: str,
+        parameters: Dict,
+        run: Callable[[], int],
+        unit: str = 'rows'
+    ):
+        result = {
+            'benchmark': name,
+            'size': server.people,
+            'parameters': parameters,
+            **measure(run, repeat, unit),
+        }
+        print(json.dumps(result), file=sys.stderr)
+        results.append(result)
+
+    def iterate_people_table():
+        table = PeopleTable(client, server.people_url, max_workers=4)
+        return petl.nrows(table)
+
+    record('people_table', {'max_workers': 4}, iterate_people_table)
+
+    extracted = petl.wrap(list(PeopleTable(client, server.people_url)))
+
+    def transform():
+        table = transform_extracted_people_table(extracted, client)
+        with client:
+            return petl.nrows(table)
+
+    record('transform', {}, transform)
+
+    planet_client = PlanetClient()
+    for name, transform_table in [
+        ('transform_fused', transform_extracted_people_table),
+        ('transform_chained', chained_transform),
+    ]:
+        def transform_in_memory(transform_table=transform_table):
+            return petl.nrows(transform_table(extracted, planet_client))
+
+        record(name, {}, transform_in_memory)
+
+    def fetch_csv():
+        with fetch_table_csv(client) as csv_file:
+            return sum(1 for _ in csv_file) - 1
+
+    with override_settings(DATASET_FETCH_URL=server.people_url):
+        record('fetch_table_csv', {}, fetch_csv)
+        with fetch_table_csv(client) as csv_file:
+            dataset = Dataset.objects.create(status=Dataset.Status.RUNNING)
+            save_dataset_file(dataset, csv_file)
+            dataset.save()
+
+    browser = Client()
+    url = f'/dataset/{dataset.uuid}/'
+    for parameters in DETAILS_PARAMETERS:
+        def details(parameters=parameters):
+            response = browser.get(url, parameters)
+            assert response.status_code == 200, response.status_code
+            return 1
+
+        record('details', parameters, details, unit='requests')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[100, 1000, 10000],
+        help='numbers of people to benchmark with (up to 1000000)',
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--output', help='file to write JSON results to')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+    results = []
+    with tempfile.TemporaryDirectory() as media_root:
+        with override_settings(MEDIA_ROOT=media_root):
+            for size in args.sizes:
+                with SwapiServer(size, page_size=args.page_size) as server:
+                    results.extend(benchmark_size(server, args.repeat))
+
+    report = json.dumps({
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': results,
+    }, indent=2)
+    if args.output:
+        pathlib.Path(args.output).write_text(report)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Local stand-in of Star Wars API serving synthetic people and planets.
+
+People are generated from their index, so any number of them can be served
+without storing them. Pages have the same shape as in Star Wars API.
+
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+PLANETS = 60
+
+
+def person(index: int, base_url: str = 'https://swapi.dev/api/') -> Dict:
+    """Get a synthetic person.
+
+    Args:
+        index: Index of the person, starting at 0.
+        base_url: Root URL of the API the person links to.
+
+    Returns:
+        Person in the shape returned by Star Wars API.
+
+    """
+    return {
+        'name': f'Person {index}',
+        'height': str(150 + index % 80) if index % 13 else 'unknown',
+        'mass': f'{1 + index % 7},{index % 1000:03}' if index % 17 == 0
+        else str(50 + index % 70),
+        'hair_color': ('brown', 'blond', 'black', 'n/a')[index % 4],
+        'skin_color': ('fair', 'gold', 'light', 'green')[index % 4],
+        'eye_color': ('blue', 'yellow', 'brown', 'red')[index % 4],
+        'birth_year': f'{index % 100}BBY',
+        'gender': ('male', 'female', 'n/a')[index % 3],
+        'homeworld': f'{base_url}planets/{index % PLANETS + 1}/',
+        'films': [f'{base_url}films/{index % 6 + 1}/'],
+        'species': [],
+        'vehicles': [],
+        'starships': [],
+        'created': '2014-12-09T13:50:51.644000Z',
+        'edited': f'2014-12-{10 + index % 20}T21:17:56.891000Z',
+        'url': f'{base_url}people/{index + 1}/',
+    }
+
+
+class SwapiServer:
+    """Star Wars API stand-in running in a background thread.
+
+    Args:
+        people: Number of people to serve.
+        page_size: Number of people on a page.
+
+    """
+
+    def __init__(self, people: int, page_size: int = 100):
+        self.people = people
+        self.page_size = page_size
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/api/'
+
+    @property
+    def people_url(self) -> str:
+        return f'{self.base_url}people/'
+
+    def __enter__(self) -> 'SwapiServer':
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                payload = server.respond(self.path)
+                status = 200 if payload is not None else 404
+                body = json.dumps(payload or {'detail': 'Not found'})
+                body = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        thread = threading.Thread(
+            target=self._server.serve_forever,
+            daemon=True,
+        )
+        thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, path: str) -> Optional[Dict]:
+        """Get the payload of a request path.
+
+        Args:
+            path: Path (with query) of the request.
+
+        Returns:
+            JSON payload, or ``None`` when the path is not found.
+
+        """
+        parts = urlsplit(path)
+        segments = [segment for segment in parts.path.split('/') if segment]
+        if segments == ['api', 'people']:
+            query = parse_qs(parts.query)
+            return self.people_page(int(query.get('page', ['1'])[0]))
+        if len(segments) == 3 and segments[:2] == ['api', 'planets']:
+            return {'name': f'Planet {segments[2]}'}
+        return None
+
+    def people_page(self, page: int) -> Optional[Dict]:
+        start = (page - 1) * self.page_size
+        if page < 1 or (start >= self.people and page > 1):
+            return None
+        stop = min(start + self.page_size, self.people)
+        has_next = stop < self.people
+        return {
+            'count': self.people,
+            'next': f'{self.people_url}?page={page + 1}' if has_next else None,
+            'previous': f'{self.people_url}?page={page - 1}'
+            if page > 1 else None,
+            'results': [
+                person(index, self.base_url) for index in range(start, stop)
+            ],
+        }
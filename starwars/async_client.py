@@ -0,0 +1,246 @@
+import asyncio
+import collections
+import itertools
+from typing import (
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    Mapping,
+    Tuple,
+    Union,
+)
+
+import httpx
+
+from starwars.client import parse_retry_after
+from starwars.ratelimit import RateLimiter
+from starwars.tables import remaining_page_urls
+
+
+class AsyncStarWarsClient(AsyncContextManager):
+    """Asynchronous client for Star Wars API.
+
+    It's an ``asyncio`` counterpart of ``StarWarsClient``, so many requests
+    can be in flight on a single event loop without tying up a thread each.
+    Requests are paced and throttled requests retried by the same
+    ``RateLimiter`` as ``StarWarsClient`` uses, so both clients can share
+    it. Errors are reported as ``httpx.HTTPStatusError`` though, as the
+    responses are httpx ones.
+
+    Args:
+        session_maker: Callable without arguments that returns an httpx
+            asynchronous client instance.
+        timeout: Default timeout of requests, either in seconds or as
+            a ``(connect, read)`` tuple. No timeout when ``None``.
+        rate_limiter: Rate limiter pacing the requests. Throttled requests
+            are retried up to ``rate_limiter.max_retries`` times. Requests
+            are not limited and never retried when ``None``.
+        max_connections: Maximum number of connections opened by
+            the default session.
+
+    """
+
+    def __init__(
+        self,
+        session_maker: Callable[[], httpx.AsyncClient] = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+        rate_limiter: RateLimiter = None,
+        max_connections: int = 16
+    ):
+        self.session_maker = session_maker
+        if self.session_maker is None:
+            self.session_maker = self.default_session_maker
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.max_connections = max_connections
+        self._session = None
+
+    async def __aenter__(self) -> 'AsyncStarWarsClient':
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, traceback):
+        await self.close()
+
+    @property
+    def session(self) -> httpx.AsyncClient:
+        """Httpx asynchronous client instance.
+
+        Returns:
+            Httpx asynchronous client instance.
+
+        Raises:
+            AssertionError: when session is not open.
+
+        """
+        assert self._session is not None, 'session is not open'
+        return self._session
+
+    async def open(self):
+        """Open new httpx session.
+
+        Raises:
+            AssertionError: when session is already open.
+
+        """
+        assert self._session is None, 'session is already open'
+        self._session = self.session_maker()
+
+    async def close(self):
+        """Close current httpx session.
+
+        Raises:
+            AssertionError: when session is not open.
+
+        """
+        await self.session.aclose()
+        self._session = None
+
+    def default_session_maker(self) -> httpx.AsyncClient:
+        """Get an httpx asynchronous client with ``max_connections``.
+
+        Returns:
+            Httpx asynchronous client.
+
+        """
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout
+            timeout = httpx.Timeout(read, connect=connect)
+        else:
+            timeout = httpx.Timeout(self.timeout)
+        return httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=self.max_connections),
+        )
+
+    async def get(self, url: str, **kwargs) -> Mapping:
+        """Get JSON data from given endpoint.
+
+        Args:
+            url: Full endpoint URL.
+            kwargs: Additional arguments to be passed to httpx.get()
+                function.
+
+        Returns:
+            JSON object extracted from response.
+
+        Raises:
+            httpx.HTTPStatusError: when the response is an error, including
+                ``429 Too Many Requests`` when all retries have been
+                throttled as well.
+
+        """
+        response = await self._get_response(url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def _get_response(self, url: str, **kwargs) -> httpx.Response:
+        if self.rate_limiter is None:
+            return await self.session.get(url, **kwargs)
+        attempt = 0
+        while True:
+            await self._acquire()
+            try:
+                response = await self.session.get(url, **kwargs)
+            except BaseException:
+                self.rate_limiter.release(failed=True)
+                raise
+            throttled = response.status_code == 429
+            retry_after = None
+            if throttled:
+                retry_after = parse_retry_after(
+                    response.headers.get('Retry-After', None)
+                )
+            self.rate_limiter.release(
+                throttled=throttled,
+                retry_after=retry_after
+            )
+            if not throttled or attempt >= self.rate_limiter.max_retries:
+                return response
+            attempt += 1
+
+    async def _acquire(self):
+        # RateLimiter blocks the calling thread, so it waits in the default
+        # executor instead of blocking the event loop.
+        loop = asyncio.get_running_loop()
+        acquired = loop.run_in_executor(None, self.rate_limiter.acquire)
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # The slot is still taken once acquire() returns, so free it.
+            acquired.add_done_callback(self._release_acquired)
+            raise
+
+    def _release_acquired(self, acquired: asyncio.Future):
+        if not acquired.cancelled() and acquired.exception() is None:
+            self.rate_limiter.release(failed=True)
+
+
+class AsyncPeopleTable:
+    """Asynchronous iterator over people from Star Wars API.
+
+    It's an ``asyncio`` counterpart of ``PeopleTable``: the header and then
+    rows are returned by ``async for``, in the original page order. When
+    ``max_concurrency`` is greater than one, the remaining pages are fetched
+    concurrently on the event loop.
+
+    Args:
+        client: Asynchronous Star Wars API client.
+        initial_url: URL of the first page of people.
+        max_concurrency: Maximum number of pages fetched at the same time.
+
+    """
+    def __init__(
+        self,
+        client: AsyncStarWarsClient,
+        initial_url: str,
+        max_concurrency: int = 1
+    ):
+        self.client = client
+        self.initial_url = initial_url
+        self.max_concurrency = max_concurrency
+
+    def __aiter__(self) -> AsyncIterator[tuple]:
+        return self._iter_rows()
+
+    async def _iter_rows(self) -> AsyncIterator[tuple]:
+        header_returned = False
+        async with self.client as client:
+            async for people_page in self._iter_pages(client):
+                for person in people_page.get('results', []):
+                    if not header_returned:
+                        yield tuple(person.keys())
+                        header_returned = True
+                    yield tuple(person.values())
+
+    async def _iter_pages(
+        self,
+        client: AsyncStarWarsClient
+    ) -> AsyncIterator[Mapping]:
+        people_page = await client.get(self.initial_url)
+        yield people_page
+        urls = None
+        if self.max_concurrency > 1:
+            urls = remaining_page_urls(people_page)
+        if urls is None:
+            next_url = people_page.get('next', None)
+            while next_url:
+                people_page = await client.get(next_url)
+                yield people_page
+                next_url = people_page.get('next', None)
+            return
+        urls = iter(urls)
+        pending = collections.deque(
+            asyncio.ensure_future(client.get(url))
+            for url in itertools.islice(urls, self.max_concurrency)
+        )
+        try:
+            while pending:
+                people_page = await pending.popleft()
+                url = next(urls, None)
+                if url is not None:
+                    pending.append(asyncio.ensure_future(client.get(url)))
+                yield people_page
+        finally:
+            for task in pending:
+                task.cancel()
@@ -1,35 +1,332 @@
-from typing import Callable, ContextManager, Mapping
+import email.utils
+import hashlib
+import json
+import os
+import pathlib
+import socket
+import tempfile
+import threading
+import time
+from typing import (
+    Callable,
+    ContextManager,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import requests
 from requests import HTTPError
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+from starwars.ratelimit import RateLimiter
 
 
 class TooManyRequests(HTTPError):
     pass
 
 
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse value of the ``Retry-After`` header.
+
+    Args:
+        value: Either a number of seconds or an HTTP date.
+
+    Returns:
+        Number of seconds to wait, or ``None`` when the value is missing or
+        invalid.
+
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class CachedResponse(NamedTuple):
+    payload: Mapping
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def conditional_headers(self) -> Mapping[str, str]:
+        """Headers that make a request conditional on this response.
+
+        Returns:
+            ``If-None-Match`` and ``If-Modified-Since`` headers.
+
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """On-disk cache of JSON responses together with their validators.
+
+    Each response is stored in a separate file named after a hash of its URL.
+    Only responses with ``ETag`` or ``Last-Modified`` headers are stored, as
+    there is no way to revalidate the other ones.
+
+    When ``max_entries`` is given, the least recently stored responses are
+    removed once there are more of them, so the directory doesn't grow
+    without bound.
+
+    Args:
+        directory: Path of the directory to store responses in. It is created
+            when it does not exist.
+        max_entries: Maximum number of responses kept. Not limited when
+            ``None``.
+
+    """
+
+    def __init__(
+        self,
+        directory: os.PathLike,
+        max_entries: Optional[int] = None,
+    ):
+        self.directory = pathlib.Path(directory)
+        self.max_entries = max_entries
+
+    def _path(self, url: str) -> pathlib.Path:
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return self.directory.joinpath(f'{digest}.json')
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Get cached response for given URL.
+
+        Args:
+            url: Full URL of the request.
+
+        Returns:
+            Cached response, or ``None`` when there is none.
+
+        """
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return CachedResponse(
+            payload=entry['payload'],
+            etag=entry.get('etag', None),
+            last_modified=entry.get('last_modified', None),
+        )
+
+    def set(self, url: str, response: CachedResponse):
+        """Store response for given URL.
+
+        The file is written atomically, so concurrent readers never see
+        a partially written response.
+
+        Args:
+            url: Full URL of the request.
+            response: Response to store.
+
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump({'url': url, **response._asdict()}, file)
+            os.replace(temp_path, self._path(url))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        if self.max_entries is not None:
+            self._cull()
+
+    def _cull(self):
+        entries = []
+        for path in self.directory.glob('*.json'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                path.unlink()
+            except OSError:
+                # Already removed by a concurrent cull.
+                pass
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that enables TCP keep-alive on pooled connections.
+
+    Idle connections kept in the pool are then probed by the operating system
+    instead of being silently dropped by proxies and load balancers.
+
+    Args:
+        keep_alive_idle: Number of seconds a connection has to be idle before
+            keep-alive probes are sent, where supported by the platform.
+        kwargs: Additional arguments passed to ``HTTPAdapter``.
+
+    """
+
+    def __init__(self, keep_alive_idle: int = 60, **kwargs):
+        self.keep_alive_idle = keep_alive_idle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        socket_options = [
+            *HTTPConnection.default_socket_options,
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            socket_options.append((
+                socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keep_alive_idle
+            ))
+        kwargs['socket_options'] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class PooledSessionMaker:
+    """Session maker that shares one tuned session between its calls.
+
+    The session is created on the first call and returned on every following
+    one, so its connection pool (and TLS connections) outlives clients
+    opening and closing it. Clients using it should be created with
+    ``keep_session=True``.
+
+    Args:
+        pool_connections: Number of connection pools (i.e. hosts) to cache.
+        pool_maxsize: Maximum number of connections kept in a pool.
+        pool_block: Whether to wait for a free connection when the pool is
+            exhausted, instead of opening a connection that is not reused.
+        max_retries: Number of retries on connection errors and on
+            ``502``, ``503`` and ``504`` responses.
+        keep_alive: Whether to enable TCP keep-alive on the connections.
+
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        max_retries: int = 0,
+        keep_alive: bool = True
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.max_retries = max_retries
+        self.keep_alive = keep_alive
+        self._session = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                self._session = self.create_session()
+            return self._session
+
+    def create_session(self) -> requests.Session:
+        """Create a new session with tuned connection pool.
+
+        Returns:
+            Requests session instance.
+
+        """
+        adapter_class = HTTPAdapter
+        if self.keep_alive:
+            adapter_class = KeepAliveHTTPAdapter
+        adapter = adapter_class(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=Retry(
+                total=self.max_retries,
+                backoff_factor=0.5,
+                status_forcelist=(502, 503, 504),
+                raise_on_status=False,
+            ),
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def close(self):
+        """Close the shared session, if it has been created."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
 class StarWarsClient(ContextManager):
     """Client for Star Wars API.
 
+    When ``response_cache`` is given, responses are stored with their
+    ``ETag`` and ``Last-Modified`` headers, and later requests for the same
+    URL are made conditional. Unchanged resources are then returned from
+    the cache.
+
+    The client can be used as a context manager again while it's open, e.g.
+    by tables of the same pipeline. The session is then closed when
+    the outermost ``with`` block exits.
+
     Args:
         base_url: Base URL for Star Wars API, e.g. https://swapi.dev/api/
         session_maker: Callable without arguments that returns a requests
             session instance.
+        response_cache: Cache to store responses in. Responses are not
+            cached when ``None``.
+        timeout: Default timeout of requests, either in seconds or as
+            a ``(connect, read)`` tuple. No timeout when ``None``.
+        keep_session: Whether to keep the session open when the client is
+            closed, e.g. when it's shared by ``PooledSessionMaker``.
+        rate_limiter: Rate limiter pacing the requests. Throttled requests
+            are retried up to ``rate_limiter.max_retries`` times. Requests
+            are not limited and never retried when ``None``.
 
     """
 
-    def __init__(self, session_maker: Callable[[], requests.Session] = None):
+    def __init__(
+        self,
+        session_maker: Callable[[], requests.Session] = None,
+        response_cache: ResponseCache = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+        keep_session: bool = False,
+        rate_limiter: RateLimiter = None
+    ):
         self.session_maker = session_maker
         if self.session_maker is None:
             self.session_maker = self.default_session_maker
+        self.response_cache = response_cache
+        self.timeout = timeout
+        self.keep_session = keep_session
+        self.rate_limiter = rate_limiter
         self._session = None
+        self._depth = 0
 
     def __enter__(self) -> 'StarWarsClient':
-        self.open()
+        if not self._depth:
+            self.open()
+        self._depth += 1
         return self
 
     def __exit__(self, exc_type, exc_val, traceback):
-        self.close()
+        self._depth -= 1
+        if not self._depth:
+            self.close()
 
     @property
     def session(self) -> requests.Session:
@@ -58,11 +355,15 @@ class StarWarsClient(ContextManager):
     def close(self):
         """Close current requests session.
 
+        The session itself is left open when ``keep_session`` is set, so its
+        connections can be reused the next time the client is opened.
+
         Raises:
             AssertionError: when session is not open.
 
         """
-        self.session.close()
+        if not self.keep_session:
+            self.session.close()
         self._session = None
 
     def default_session_maker(self) -> requests.Session:
@@ -83,15 +384,69 @@ class StarWarsClient(ContextManager):
                 function.
 
         Returns:
-            JSON object extracted from response.
+            JSON object extracted from response, or the cached one when
+            the server responded with ``304 Not Modified``.
 
         Raises:
-            TooManyRequests: when rate limit has been exceeded.
+            TooManyRequests: when rate limit has been exceeded (and all
+                retries have been throttled as well).
             requests.ResponseError: when any other response error occurred.
 
         """
-        response = self.session.get(url, **kwargs)
-        if response.status_code == 429:
-            raise TooManyRequests(response=response)
+        cache_key = cached = None
+        if self.response_cache is not None:
+            cache_key = requests.Request(
+                'GET', url, params=kwargs.get('params', None)
+            ).prepare().url
+            cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            kwargs['headers'] = {
+                **cached.conditional_headers,
+                **kwargs.get('headers', {}),
+            }
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        response = self._get_response(url, **kwargs)
+        if cached is not None and response.status_code == 304:
+            return cached.payload
         response.raise_for_status()
-        return response.json()
+        payload = response.json()
+        etag = response.headers.get('ETag', None)
+        last_modified = response.headers.get('Last-Modified', None)
+        if cache_key is not None and (etag or last_modified):
+            self.response_cache.set(cache_key, CachedResponse(
+                payload=payload,
+                etag=etag,
+                last_modified=last_modified,
+            ))
+        return payload
+
+    def _get_response(self, url: str, **kwargs) -> requests.Response:
+        if self.rate_limiter is None:
+            response = self.session.get(url, **kwargs)
+            if response.status_code == 429:
+                raise TooManyRequests(response=response)
+            return response
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, **kwargs)
+            except BaseException:
+                self.rate_limiter.release(failed=True)
+                raise
+            throttled = response.status_code == 429
+            retry_after = None
+            if throttled:
+                retry_after = parse_retry_after(
+                    response.headers.get('Retry-After', None)
+                )
+            self.rate_limiter.release(
+                throttled=throttled,
+                retry_after=retry_after
+            )
+            if not throttled:
+                return response
+            if attempt >= self.rate_limiter.max_retries:
+                raise TooManyRequests(response=response)
+            attempt += 1
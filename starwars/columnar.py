@@ -0,0 +1,788 @@
+import array
+import collections
+import itertools
+import json
+import math
+import mmap
+import operator
+import re
+import struct
+import sys
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import petl
+from petl.comparison import Comparable
+
+MAGIC = b'SWCOL\x00\x01\x00'
+# Version of the metadata layout, bumped whenever the layout changes.
+VERSION = 1
+
+NUMBER = 'number'
+STRING = 'string'
+
+NULL_VALUES = frozenset({'', 'unknown', 'n/a', 'none'})
+
+_LENGTH = struct.Struct('<Q')
+_ALIGNMENT = 8
+_NUMBER_PATTERN = re.compile(r'[+-]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?')
+
+
+def _padding(position: int) -> bytes:
+    return b'\x00' * (-position % _ALIGNMENT)
+
+
+def parse_number(value) -> Optional[float]:
+    """Parse a number from a value of a people table.
+
+    Numbers may have thousands separated with commas, e.g. ``1,358``. Values
+    like ``unknown`` or ``n/a`` are nulls.
+
+    Args:
+        value: Value to parse.
+
+    Returns:
+        The number, or ``None`` when the value is null.
+
+    Raises:
+        ValueError: when the value is neither a number nor null.
+
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if text.lower() in NULL_VALUES:
+        return None
+    if not _NUMBER_PATTERN.fullmatch(text):
+        raise ValueError(f'not a number: {value!r}')
+    return float(text.replace(',', ''))
+
+
+def parse_numbers(values: Sequence) -> Optional[array.array]:
+    """Parse distinct values of a column as numbers.
+
+    A column is numeric when all its values are numbers or nulls, and at
+    least one of them is a number.
+
+    Args:
+        values: Distinct values of a column.
+
+    Returns:
+        Array of numbers with NaN for nulls, or ``None`` when the column
+        is not numeric.
+
+    """
+    numbers = array.array('d')
+    for value in values:
+        try:
+            number = parse_number(value)
+        except ValueError:
+            return None
+        numbers.append(math.nan if number is None else number)
+    if all(math.isnan(number) for number in numbers):
+        return None
+    return numbers
+
+
+def sort_values(
+    values: Sequence,
+    numbers: Sequence[float] = None
+) -> array.array:
+    """Get codes of distinct values sorted by the values.
+
+    Values of numeric columns are compared as numbers, with nulls last.
+    Other values are compared the same way ``petl.sort()`` compares them.
+
+    Args:
+        values: Distinct values, indexed by their codes.
+        numbers: Values parsed with ``parse_numbers()``, if the column is
+            numeric.
+
+    Returns:
+        Array of codes in ascending order of their values.
+
+    """
+    if numbers is not None:
+        return array.array('I', sorted(
+            range(len(values)),
+            key=lambda code: (math.isnan(numbers[code]), numbers[code])
+        ))
+    return array.array('I', sorted(
+        range(len(values)),
+        key=lambda code: Comparable(values[code])
+    ))
+
+
+def sort_rows(
+    codes: Sequence[int],
+    counts: Sequence[int],
+    value_order: Sequence[int]
+) -> array.array:
+    """Get indices of rows sorted by their values, with a counting sort.
+
+    Rows with equal values keep their original order.
+
+    Args:
+        codes: Codes of the values of a column, one per row.
+        counts: Number of occurrences of the values, indexed by codes.
+        value_order: Codes in ascending order of their values.
+
+    Returns:
+        Array of row indices in ascending order of their values.
+
+    """
+    offsets = array.array('I', [0]) * len(counts)
+    offset = 0
+    for code in value_order:
+        offsets[code] = offset
+        offset += counts[code]
+    order = array.array('I', [0]) * len(codes)
+    for row, code in enumerate(codes):
+        order[offsets[code]] = row
+        offsets[code] += 1
+    return order
+
+
+class ColumnBuilder:
+    """Dictionary encoder of a single column.
+
+    Distinct values get codes in order of their first occurrence. Number of
+    occurrences of each value is counted as well, and stored as the value
+    count index of the column. Indices of rows sorted by their values are
+    stored as the sort order index. When all values are numbers or nulls,
+    the column is numeric and its values are stored as numbers as well.
+
+    Args:
+        name: Name of the column.
+
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.codes = array.array('I')
+        self.counts = array.array('I')
+        self._values = {}
+
+    @property
+    def values(self) -> List:
+        return list(self._values)
+
+    def append(self, value):
+        code = self._values.get(value, None)
+        if code is None:
+            code = self._values[value] = len(self._values)
+            self.counts.append(0)
+        self.codes.append(code)
+        self.counts[code] += 1
+
+    def arrays(self) -> Dict[str, array.array]:
+        """Get arrays of the column to store in the data section.
+
+        Returns:
+            Mapping of array names to arrays.
+
+        """
+        numbers = parse_numbers(self.values)
+        value_order = sort_values(self.values, numbers)
+        arrays = {
+            'codes': self.codes,
+            'counts': self.counts,
+            'value_order': value_order,
+            'order': sort_rows(self.codes, self.counts, value_order),
+        }
+        if numbers is not None:
+            arrays['numbers'] = numbers
+        return arrays
+
+    def metadata(self) -> Dict:
+        """Get metadata of the column, without its values and arrays.
+
+        Returns:
+            JSON-serializable metadata.
+
+        """
+        return {'name': self.name}
+
+
+def write_columns(table: petl.Table, file: BinaryIO) -> Dict[str, str]:
+    """Write table to a file in the columnar format.
+
+    Each column is dictionary-encoded: its distinct values are stored once,
+    and rows refer to them by codes kept in a typed array. The file consists
+    of a magic string, the length of the metadata, the metadata itself (JSON)
+    and the data section with arrays aligned to 8 bytes::
+
+        | MAGIC | metadata length (uint64) | metadata | padding | arrays |
+
+    Arrays are stored in little-endian byte order and referenced from
+    the metadata by their offset in the data section, so they can be read
+    straight from a memory-mapped file without copying. Distinct values of
+    each column are stored in the data section too (as JSON), so only
+    the columns that are read get decoded. The metadata holds the ``VERSION``
+    of its layout, and files of other versions are rejected when read.
+
+    Types of the columns are inferred while writing: numeric columns also
+    get an array of their distinct values parsed as numbers.
+
+    Args:
+        table: ETL table to write.
+        file: File opened for writing in binary mode.
+
+    Returns:
+        Schema of the table, mapping column names to their types
+        (``number`` or ``string``).
+
+    Raises:
+        ValueError: when the table is empty, without even a header.
+
+    """
+    it = iter(table)
+    try:
+        header = next(it)
+    except StopIteration:
+        raise ValueError('cannot write a table without a header') from None
+    builders = [ColumnBuilder(str(field)) for field in header]
+    rows = 0
+    for row in it:
+        for index, builder in enumerate(builders):
+            builder.append(row[index] if index < len(row) else None)
+        rows += 1
+
+    columns_metadata = []
+    blocks = []
+    offset = 0
+    for builder in builders:
+        arrays = builder.arrays()
+        column_metadata = builder.metadata()
+        column_metadata['type'] = NUMBER if 'numbers' in arrays else STRING
+        data = json.dumps(builder.values).encode('utf-8')
+        column_metadata['values'] = {'offset': offset, 'length': len(data)}
+        blocks.append(data + _padding(len(data)))
+        offset += len(blocks[-1])
+        column_metadata['arrays'] = {}
+        for name, values in arrays.items():
+            if sys.byteorder != 'little':
+                values = array.array(values.typecode, values)
+                values.byteswap()
+            data = values.tobytes()
+            column_metadata['arrays'][name] = {
+                'typecode': values.typecode,
+                'offset': offset,
+                'length': len(values),
+            }
+            blocks.append(data + _padding(len(data)))
+            offset += len(blocks[-1])
+        columns_metadata.append(column_metadata)
+
+    metadata = json.dumps({
+        'version': VERSION,
+        'rows': rows,
+        'columns': columns_metadata,
+    }).encode('utf-8')
+    file.write(MAGIC)
+    file.write(_LENGTH.pack(len(metadata)))
+    file.write(metadata)
+    file.write(_padding(len(MAGIC) + _LENGTH.size + len(metadata)))
+    for block in blocks:
+        file.write(block)
+    return {
+        column['name']: column['type'] for column in columns_metadata
+    }
+
+
+class ColumnarFile:
+    """Reader of a file in the columnar format.
+
+    Arrays are returned as memory views of the underlying buffer, so reading
+    them does not copy the data.
+
+    Args:
+        buffer: Content of the file, e.g. bytes or a memory map.
+
+    Raises:
+        ValueError: when the buffer does not contain a columnar file, or
+            the file has an unsupported version.
+
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError('not a columnar dataset file')
+        position = len(MAGIC)
+        (metadata_length,) = _LENGTH.unpack_from(self.buffer, position)
+        position += _LENGTH.size
+        metadata = json.loads(
+            bytes(self.buffer[position:position + metadata_length])
+        )
+        position += metadata_length
+        version = metadata.get('version', None)
+        if version != VERSION:
+            raise ValueError(f'unsupported columnar file version: {version}')
+        self._data_offset = position + len(_padding(position))
+        self.rows: int = metadata['rows']
+        self.columns: Mapping[str, Dict] = {
+            column['name']: column for column in metadata['columns']
+        }
+        self._values: Dict[str, List] = {}
+
+    @classmethod
+    def open(cls, file) -> 'ColumnarFile':
+        """Open a columnar file, memory-mapping it when possible.
+
+        Args:
+            file: Django file (e.g. ``FieldFile``) or file object opened in
+                binary mode.
+
+        Returns:
+            Reader of the file.
+
+        """
+        try:
+            path = file.path
+        except (AttributeError, NotImplementedError):
+            path = None
+        if path is None:
+            file.seek(0)
+            return cls(file.read())
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @property
+    def header(self) -> tuple:
+        return tuple(self.columns)
+
+    @property
+    def schema(self) -> Dict[str, str]:
+        """Types of the columns, ``number`` or ``string``."""
+        return {
+            name: column.get('type', STRING)
+            for name, column in self.columns.items()
+        }
+
+    def values(self, field: str) -> List:
+        """Get distinct values of a column, indexed by their codes.
+
+        Values are decoded on first use, so columns which are never read
+        are never decoded.
+
+        Args:
+            field: Name of the column.
+
+        Returns:
+            List of distinct values.
+
+        """
+        values = self._values.get(field, None)
+        if values is None:
+            spec = self.columns[field]['values']
+            start = self._data_offset + spec['offset']
+            values = json.loads(
+                bytes(self.buffer[start:start + spec['length']])
+            )
+            self._values[field] = values
+        return values
+
+    def array(self, field: str, name: str) -> Sequence:
+        """Get an array of a column.
+
+        Args:
+            field: Name of the column.
+            name: Name of the array, e.g. ``codes``.
+
+        Returns:
+            Memory view of the array (or its copy on big-endian platforms).
+
+        """
+        spec = self.columns[field]['arrays'][name]
+        itemsize = array.array(spec['typecode']).itemsize
+        start = self._data_offset + spec['offset']
+        view = self.buffer[start:start + spec['length'] * itemsize]
+        if sys.byteorder != 'little':
+            values = array.array(spec['typecode'], bytes(view))
+            values.byteswap()
+            return values
+        return view.cast(spec['typecode'])
+
+    def codes(self, field: str) -> Sequence[int]:
+        """Get codes of the values of a column, one per row.
+
+        Args:
+            field: Name of the column.
+
+        Returns:
+            Sequence of codes.
+
+        """
+        return self.array(field, 'codes')
+
+    def counts(self, field: str) -> Sequence[int]:
+        """Get number of occurrences of the values of a column.
+
+        Args:
+            field: Name of the column.
+
+        Returns:
+            Sequence of counts, indexed by codes of the values.
+
+        """
+        return self.array(field, 'counts')
+
+    def numbers(self, field: str) -> Optional[Sequence[float]]:
+        """Get distinct values of a numeric column parsed as numbers.
+
+        Args:
+            field: Name of the column.
+
+        Returns:
+            Sequence of numbers with NaN for nulls, indexed by codes of
+            the values, or ``None`` when the column is not numeric.
+
+        """
+        if 'numbers' not in self.columns[field]['arrays']:
+            return None
+        return self.array(field, 'numbers')
+
+    def nulls(self, field: str) -> Set[int]:
+        """Get codes of null values of a numeric column.
+
+        Args:
+            field: Name of the column.
+
+        Returns:
+            Set of codes, empty when the column is not numeric.
+
+        """
+        numbers = self.numbers(field)
+        if numbers is None:
+            return set()
+        return {
+            code for code, number in enumerate(numbers) if math.isnan(number)
+        }
+
+    def value_order(self, field: str) -> Sequence[int]:
+        """Get codes of distinct values of a column sorted by the values.
+
+        Args:
+            field: Name of the column.
+
+        Returns:
+            Sequence of codes in ascending order of their values.
+
+        """
+        return self.array(field, 'value_order')
+
+    def ranks(self, field: str) -> Sequence[int]:
+        """Get positions of distinct values of a column in sorted order.
+
+        Args:
+            field: Name of the column.
+
+        Returns:
+            Sequence of positions, indexed by codes of the values.
+
+        """
+        value_order = self.value_order(field)
+        ranks = array.array('I', [0]) * len(value_order)
+        for rank, code in enumerate(value_order):
+            ranks[code] = rank
+        return ranks
+
+    def order(self, field: str) -> Sequence[int]:
+        """Get indices of rows sorted by values of a column.
+
+        Rows with equal values are in their original order.
+
+        Args:
+            field: Name of the column.
+
+        Returns:
+            Sequence of row indices in ascending order of their values.
+
+        """
+        return self.array(field, 'order')
+
+    def sorted_rows(self, field: str, reverse: bool = False) -> Iterator[int]:
+        """Iterate over indices of rows sorted by values of a column.
+
+        The sort order index is read lazily, so getting the first k rows
+        costs O(k) in both directions. Rows with equal values keep their
+        original order in both directions, like with ``petl.sort()``.
+        Numeric columns are sorted by numbers, with nulls last in both
+        directions.
+
+        Args:
+            field: Name of the column.
+            reverse: Whether to sort in descending order.
+
+        Returns:
+            Iterator over row indices.
+
+        """
+        order = self.order(field)
+        if not reverse:
+            return iter(order)
+        return self._iter_descending_rows(field, order)
+
+    def _iter_descending_rows(
+        self,
+        field: str,
+        order: Sequence[int]
+    ) -> Iterator[int]:
+        counts = self.counts(field)
+        value_order = list(self.value_order(field))
+        nulls = self.nulls(field)
+        # Null values are sorted last, and stay last in descending order.
+        end = len(order)
+        while value_order and value_order[-1] in nulls:
+            end -= counts[value_order.pop()]
+        nulls_start = end
+        for code in reversed(value_order):
+            start = end - counts[code]
+            yield from order[start:end]
+            end = start
+        yield from order[nulls_start:]
+
+
+class ColumnarTable(petl.Table):
+    """ETL table reading rows from a columnar file.
+
+    Values are decoded column by column from their codes, so no parsing is
+    done on iteration. Sorting and slicing the table only changes which
+    rows are read, using the sort order indexes of the file, so reading
+    a page of rows costs only that page.
+
+    Args:
+        columns: Reader of the columnar file.
+        fields: Names of the columns to read. All columns when ``None``.
+        order_by: Name of the column to sort the rows by. Rows are in their
+            original order when ``None``.
+        reverse: Whether to sort the rows in descending order.
+        start: Index of the first (sorted) row to read.
+        stop: Index of the (sorted) row to stop reading at. All rows when
+            ``None``.
+
+    """
+
+    def __init__(
+        self,
+        columns: ColumnarFile,
+        fields: Optional[Iterable[str]] = None,
+        order_by: Optional[str] = None,
+        reverse: bool = False,
+        start: int = 0,
+        stop: Optional[int] = None
+    ):
+        self.columns = columns
+        self.fields = tuple(fields) if fields is not None else columns.header
+        self.order_by = order_by
+        self.reverse = reverse
+        self.start = start
+        self.stop = stop
+
+    def __iter__(self):
+        yield self.fields
+        if self.order_by is None:
+            decoded = [
+                map(self.columns.values(field).__getitem__,
+                    self.columns.codes(field)[self.start:self.stop])
+                for field in self.fields
+            ]
+            yield from zip(*decoded)
+            return
+        rows = self.columns.sorted_rows(self.order_by, reverse=self.reverse)
+        yield from self.rows(itertools.islice(rows, self.start, self.stop))
+
+    def rows(self, indices: Iterable[int]) -> Iterator[tuple]:
+        """Read rows at given indices of the file.
+
+        Only the given rows are decoded, so reading a few rows of a large
+        file costs only those rows.
+
+        Args:
+            indices: Indices of the rows in the file, regardless of the sort
+                order and the range of the table.
+
+        Returns:
+            Iterator over the rows (without the header), in the order of
+            the indices.
+
+        """
+        columns = [
+            (self.columns.values(field), self.columns.codes(field))
+            for field in self.fields
+        ]
+        return (
+            tuple(values[codes[row]] for values, codes in columns)
+            for row in indices
+        )
+
+    def sort(self, order_by: str, reverse: bool = False) -> 'ColumnarTable':
+        """Sort table by values of a column, using its sort order index.
+
+        Args:
+            order_by: Name of the column to sort by.
+            reverse: Whether to sort in descending order.
+
+        Returns:
+            Sorted ETL table.
+
+        """
+        return ColumnarTable(
+            self.columns,
+            fields=self.fields,
+            order_by=order_by,
+            reverse=reverse,
+        )
+
+    def slice(self, start: int = 0, stop: int = None) -> 'ColumnarTable':
+        """Select a range of (sorted) rows of the table.
+
+        Args:
+            start: Index of the first row, relative to the current range.
+            stop: Index of the row to stop at, relative to the current
+                range. All remaining rows when ``None``.
+
+        Returns:
+            ETL table with the selected rows only.
+
+        """
+        start, stop = self.start + start, (
+            self.start + stop if stop is not None else None
+        )
+        if self.stop is not None:
+            start = min(start, self.stop)
+            stop = self.stop if stop is None else min(stop, self.stop)
+        return ColumnarTable(
+            self.columns,
+            fields=self.fields,
+            order_by=self.order_by,
+            reverse=self.reverse,
+            start=start,
+            stop=stop,
+        )
+
+    def value_counts(self, fields: Sequence[str]) -> 'ValueCountsTable':
+        """Aggregate table by given fields and add column with value counts.
+
+        Args:
+            fields: Names of the fields to aggregate the table by.
+
+        Returns:
+            ETL table with aggregated value counts for selected fields.
+
+        """
+        return ValueCountsTable(self.columns, fields)
+
+
+class ValueCountsTable(petl.Table):
+    """ETL table with value counts of columns of a columnar file.
+
+    Counts of a single column are read from its value count index, and
+    counts of multiple columns are derived from their codes, so no values
+    are decoded until the result is returned. The result is the same as
+    ``petl.valuecounts()`` without the ``frequency`` column: most common
+    values first, ties in order of their first occurrence.
+
+    The counts can be sorted by any of the columns, which compares the codes
+    by their positions in the sort order of the values, so numeric columns
+    are sorted by numbers like in ``ColumnarTable``.
+
+    Args:
+        columns: Reader of the columnar file.
+        fields: Names of the fields to aggregate the table by.
+        order_by: Name of the column to sort the counts by, including
+            ``count``. Most common values are first when ``None``.
+        reverse: Whether to sort the counts in descending order.
+
+    """
+
+    def __init__(
+        self,
+        columns: ColumnarFile,
+        fields: Sequence[str],
+        order_by: Optional[str] = None,
+        reverse: bool = False
+    ):
+        self.columns = columns
+        self.fields = tuple(fields)
+        self.order_by = order_by
+        self.reverse = reverse
+
+    def __iter__(self):
+        yield (*self.fields, 'count')
+        counts = self._count()
+        if self.order_by is not None:
+            counts = self._sort(counts)
+        values = [self.columns.values(field) for field in self.fields]
+        for codes, count in counts:
+            yield (*map(operator.getitem, values, codes), count)
+
+    def sort(
+        self,
+        order_by: str,
+        reverse: bool = False
+    ) -> 'ValueCountsTable':
+        """Sort counts by values of a column.
+
+        Args:
+            order_by: Name of the column to sort by.
+            reverse: Whether to sort in descending order.
+
+        Returns:
+            Sorted ETL table.
+
+        """
+        return ValueCountsTable(
+            self.columns,
+            self.fields,
+            order_by=order_by,
+            reverse=reverse,
+        )
+
+    def _count(self) -> List[Tuple[tuple, int]]:
+        if len(self.fields) == 1:
+            (field,) = self.fields
+            return sorted(
+                (((code,), count) for code, count
+                 in enumerate(self.columns.counts(field))),
+                key=operator.itemgetter(1),
+                reverse=True,
+            )
+        counter = collections.Counter(zip(*(
+            self.columns.codes(field) for field in self.fields
+        )))
+        return counter.most_common()
+
+    def _sort(
+        self,
+        counts: List[Tuple[tuple, int]]
+    ) -> List[Tuple[tuple, int]]:
+        if self.order_by not in self.fields:
+            return sorted(
+                counts,
+                key=operator.itemgetter(1),
+                reverse=self.reverse,
+            )
+        index = self.fields.index(self.order_by)
+        ranks = self.columns.ranks(self.order_by)
+        nulls = self.columns.nulls(self.order_by)
+        counts = sorted(
+            counts,
+            key=lambda item: ranks[item[0][index]],
+            reverse=self.reverse,
+        )
+        # Null values are sorted last, and stay last in descending order.
+        return sorted(counts, key=lambda item: item[0][index] in nulls)
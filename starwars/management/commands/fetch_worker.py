@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from starwars.models import Dataset
+from starwars.services import (
+    claim_fetch_job,
+    create_client,
+    get_dataset_compression,
+    run_fetch_job,
+)
+
+
+class Command(BaseCommand):
+    help = 'Run dataset fetch jobs submitted from the web application.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when there are no more pending jobs.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.DATASET_JOB_POLL_INTERVAL,
+            help='Number of seconds to wait between polls for new jobs.',
+        )
+
+    def handle(self, *args, once: bool, interval: float, **options):
+        # Fail on start rather than on every job when misconfigured.
+        get_dataset_compression()
+        while True:
+            dataset = claim_fetch_job()
+            if dataset is None:
+                if once:
+                    return
+                time.sleep(interval)
+                continue
+            self.stdout.write(f'Fetching dataset {dataset.uuid!s}...')
+            dataset = run_fetch_job(dataset, create_client())
+            if dataset.status == Dataset.Status.DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Fetched dataset {dataset.uuid!s} in '
+                    f'{dataset.duration.total_seconds():.2f}s'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f'Could not fetch dataset {dataset.uuid!s}: '
+                    f'{dataset.error}'
+                ))
@@ -0,0 +1,328 @@
+import bisect
+import contextlib
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+    120.0, 300.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def format_value(value: float) -> str:
+    """Format a sample value the way Prometheus expects it.
+
+    Args:
+        value: Value of the sample.
+
+    Returns:
+        The value, with integral values formatted without a fraction.
+
+    """
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(labels: Labels) -> str:
+    """Format labels of a sample in the Prometheus text format.
+
+    Args:
+        labels: Pairs of label names and values.
+
+    Returns:
+        Labels in curly braces, or an empty string when there are none.
+
+    """
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Metric:
+    """Base of metrics with samples split by labels.
+
+    Args:
+        name: Name of the metric.
+        documentation: Help text of the metric.
+        labelnames: Names of labels the samples of the metric are split by.
+
+    """
+    type = 'untyped'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, labels: Dict[str, str]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f'{self.name} expects labels {self.labelnames}, '
+                f'got {tuple(labels)}'
+            )
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+
+class Counter(Metric):
+    """Prometheus counter, a sum that only goes up."""
+    type = 'counter'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = ()
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        """Increase the counter.
+
+        Args:
+            amount: Non-negative amount to increase the counter by.
+            **labels: Values of all the labels of the metric.
+
+        Raises:
+            ValueError: When the amount is negative or labels do not match.
+
+        """
+        if amount < 0:
+            raise ValueError('Counters can only be increased')
+        key = self._labels(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Get current value of the counter."""
+        return self._values.get(self._labels(labels), 0)
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        """Iterate over samples of the metric.
+
+        Yields:
+            Tuples of sample names, labels and values.
+
+        """
+        for labels, value in sorted(self._values.items()):
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    """Prometheus histogram, counting observations in cumulative buckets.
+
+    Args:
+        name: Name of the metric.
+        documentation: Help text of the metric.
+        labelnames: Names of labels the samples of the metric are split by.
+        buckets: Upper bounds of the buckets, in increasing order. The
+            ``+Inf`` bucket is always added.
+
+    """
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if not self.buckets or not math.isinf(self.buckets[-1]):
+            self.buckets += (math.inf,)
+        self._observations: Dict[Labels, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        """Record an observation.
+
+        Args:
+            value: Observed value, e.g. duration in seconds.
+            **labels: Values of all the labels of the metric.
+
+        """
+        key = self._labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        counts, total = self._observations.get(
+            key,
+            ([0] * len(self.buckets), 0.0),
+        )
+        counts[index] += 1
+        self._observations[key] = (counts, total + value)
+
+    def set(self, buckets: Sequence[int], total: float, **labels: str):
+        """Set observations aggregated elsewhere, e.g. by the database.
+
+        Args:
+            buckets: Cumulative numbers of observations less than or equal
+                to the upper bound of each bucket, the ``+Inf`` one included.
+            total: Sum of the observed values.
+            **labels: Values of all the labels of the metric.
+
+        Raises:
+            ValueError: When the number of buckets or labels do not match.
+
+        """
+        if len(buckets) != len(self.buckets):
+            raise ValueError(
+                f'{self.name} expects {len(self.buckets)} buckets, '
+                f'got {len(buckets)}'
+            )
+        counts = [
+            count - previous
+            for previous, count in zip((0, *buckets), buckets)
+        ]
+        self._observations[self._labels(labels)] = (counts, total)
+
+    def samples(self) -> Iterator[Tuple[str, Labels, float]]:
+        """Iterate over samples of the metric.
+
+        Yields:
+            Tuples of sample names, labels and values.
+
+        """
+        for labels, (counts, total) in sorted(self._observations.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield (
+                    f'{self.name}_bucket',
+                    (*labels, ('le', format_value(bound))),
+                    cumulative,
+                )
+            yield f'{self.name}_count', labels, cumulative
+            yield f'{self.name}_sum', labels, total
+
+
+class Registry:
+    """Collection of metrics rendered together on a metrics endpoint."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric to the registry.
+
+        Args:
+            metric: Counter or histogram to add.
+
+        Returns:
+            The metric.
+
+        Raises:
+            ValueError: When a metric with the same name is registered.
+
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        """Create and register a counter, see ``Counter``."""
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        """Create and register a histogram, see ``Histogram``."""
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        """Render all the metrics in the Prometheus text exposition format.
+
+        Returns:
+            Text of the metrics endpoint.
+
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(
+                    f'{name}{format_labels(labels)} {format_value(value)}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+class Timings:
+    """Time spent in stages of a pipeline, and counts of its operations.
+
+    Stages are timed separately, so time of nested stages has to be
+    subtracted by the caller when the outer stage should not include it.
+    Timings can be updated from multiple threads.
+
+    Args:
+        clock: Callable returning monotonic time in seconds.
+
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self._seconds: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        """Add time spent in a stage.
+
+        Args:
+            stage: Name of the stage.
+            seconds: Number of seconds spent in the stage.
+
+        """
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Add duration of the block to a stage."""
+        time_start = self.clock()
+        try:
+            yield
+        finally:
+            self.add(stage, self.clock() - time_start)
+
+    def count(self, name: str, amount: int = 1):
+        """Count operations of a pipeline, e.g. fetched pages.
+
+        Args:
+            name: Name of the operations.
+            amount: Number of operations to add.
+
+        """
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def seconds(self, *stages: str) -> float:
+        """Get total time spent in given stages."""
+        return sum(self._seconds.get(stage, 0.0) for stage in stages)
+
+    def as_dict(self) -> Dict[str, Dict]:
+        """Get the timings in a JSON-serializable form.
+
+        Returns:
+            Mapping with ``seconds`` spent in each stage and ``counts`` of
+            the operations.
+
+        """
+        return {
+            'seconds': dict(self._seconds),
+            'counts': dict(self._counts),
+        }
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.5 on 2026-10-18 03:31
+
+from django.db import migrations, models
+import starwars.models
+
+
+def mark_existing_datasets_done(apps, schema_editor):
+    Dataset = apps.get_model('starwars', 'Dataset')
+    Dataset.objects.update(status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwars', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='duration',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='pages_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='pages_total',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='dataset',
+            name='file',
+            field=models.FileField(blank=True, upload_to=starwars.models.dataset_destination),
+        ),
+        migrations.RunPython(
+            mark_existing_datasets_done,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.5 on 2026-10-18 03:33
+
+from django.db import migrations, models
+import starwars.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwars', '0002_dataset_fetch_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='columns',
+            field=models.FileField(blank=True, upload_to=starwars.models.dataset_destination),
+        ),
+    ]
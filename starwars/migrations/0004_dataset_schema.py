@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwars', '0003_dataset_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='schema',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
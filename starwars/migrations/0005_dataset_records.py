@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwars', '0004_dataset_schema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='records',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwars', '0005_dataset_records'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
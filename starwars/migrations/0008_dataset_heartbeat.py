@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwars', '0007_dataset_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,5 @@
 import pathlib
+from typing import Optional
 from uuid import uuid4
 
 from django.db import models
@@ -26,10 +27,56 @@ def dataset_destination(instance: 'Dataset', filename: str = None) -> str:
     )
 
 
+def blob_destination(checksum: str, extension: str = '.csv') -> str:
+    """Determine content-addressed path of a dataset file.
+
+    Files with the same content get the same path, so they are stored only
+    once and shared by all datasets that contain them.
+
+    Args:
+        checksum (str): SHA-256 hex digest of the file content.
+        extension (str, optional): extension of the file.
+
+    Returns:
+        str: file path in the storage.
+
+    """
+    return f'blobs/{checksum[:2]}/{checksum}{extension}'
+
+
 class Dataset(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
     uuid = models.UUIDField(unique=True, default=uuid4)
     date = models.DateTimeField(default=timezone.now)
-    file = models.FileField(upload_to=dataset_destination)
+    file = models.FileField(upload_to=dataset_destination, blank=True)
+    columns = models.FileField(upload_to=dataset_destination, blank=True)
+    schema = models.JSONField(default=dict, blank=True)
+    records = models.JSONField(default=list, blank=True)
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)
+    status = models.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+        db_index=True,
+    )
+    pages_done = models.PositiveIntegerField(default=0)
+    pages_total = models.PositiveIntegerField(null=True, blank=True)
+    duration = models.DurationField(null=True, blank=True)
+    timings = models.JSONField(default=dict, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
 
     class Meta:
         ordering = ('-date',)
+
+    @property
+    def progress(self) -> Optional[int]:
+        """Percentage of fetched pages, when the number of pages is known."""
+        if not self.pages_total:
+            return None
+        return min(100, round(100 * self.pages_done / self.pages_total))
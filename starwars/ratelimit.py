@@ -0,0 +1,144 @@
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+
+class RateLimiter:
+    """Token bucket rate limiter with adaptive concurrency limit.
+
+    Requests are paced to ``rate`` per second, with up to ``burst`` requests
+    sent at once. The number of requests in flight is limited too, and the
+    limit adapts to the API: it's halved whenever a request gets throttled
+    and grows by one after as many successful requests as the current limit
+    (additive increase, multiplicative decrease).
+
+    A throttled request pauses all requests, either for the time given by
+    the ``Retry-After`` header, or for a jittered exponential backoff when
+    the header is missing.
+
+    Args:
+        rate: Number of requests allowed per second.
+        burst: Number of requests that can be sent at once (capacity of
+            the bucket). Defaults to ``rate``.
+        max_concurrency: Maximum number of requests in flight.
+        max_retries: Number of times a throttled request is retried.
+        backoff_base: Initial backoff delay in seconds.
+        backoff_max: Maximum backoff delay in seconds.
+        clock: Callable returning monotonic time in seconds.
+        sleep: Callable suspending the thread for given number of seconds.
+
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = None,
+        max_concurrency: int = 16,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.sleep = sleep
+        self.concurrency = max_concurrency
+        self._tokens = self.burst
+        self._updated_at = clock()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._successes = 0
+        self._throttled_streak = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Wait until a request can be sent.
+
+        Blocks until there is a free concurrency slot, the pause after
+        throttling is over, and there is a token in the bucket.
+
+        """
+        with self._condition:
+            while self._in_flight >= self.concurrency:
+                self._condition.wait()
+            self._in_flight += 1
+        while True:
+            with self._condition:
+                now = self.clock()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                delay = self._blocked_until - now
+                if delay <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    delay = (1 - self._tokens) / self.rate
+            self.sleep(delay)
+
+    def release(
+        self,
+        throttled: bool = False,
+        retry_after: float = None,
+        failed: bool = False
+    ):
+        """Report that a request has finished.
+
+        Args:
+            throttled: Whether the API responded with ``429 Too Many
+                Requests``.
+            retry_after: Number of seconds to wait before the next request,
+                as requested by the API.
+            failed: Whether the request failed without a response, e.g. with
+                a connection error. Failed requests only free their slot,
+                they neither count as successful nor change the limit.
+
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if not failed:
+                if throttled:
+                    self._throttled_streak += 1
+                    self._successes = 0
+                    self.concurrency = max(1, self.concurrency // 2)
+                    delay = self.backoff(self._throttled_streak, retry_after)
+                    self._blocked_until = max(
+                        self._blocked_until,
+                        self.clock() + delay
+                    )
+                else:
+                    self._throttled_streak = 0
+                    self._successes += 1
+                    if self._successes >= self.concurrency:
+                        self._successes = 0
+                        self.concurrency = min(
+                            self.max_concurrency,
+                            self.concurrency + 1
+                        )
+            self._condition.notify_all()
+
+    def backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Get delay before the next request after throttling.
+
+        Args:
+            attempt: Number of consecutive throttled requests.
+            retry_after: Number of seconds requested by the API, if any.
+
+        Returns:
+            Number of seconds to wait, never less than ``retry_after``.
+
+        """
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
@@ -1,28 +1,917 @@
+import contextlib
+import csv
+import functools
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import pathlib
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
 import petl
 from django.conf import settings
-from django.core.files.base import ContentFile
-from django.db import transaction
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.db.models import (
+    Aggregate,
+    Count,
+    Expression,
+    F,
+    Field,
+    FloatField,
+    IntegerField,
+    Q,
+    Sum,
+)
+from django.db.models.fields.json import KeyTextTransform, KeyTransform
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from starwars.client import PooledSessionMaker, ResponseCache, StarWarsClient
+from starwars.columnar import ColumnarFile, ColumnarTable, write_columns
+from starwars.metrics import Registry, Timings
+from starwars.models import Dataset, blob_destination
+from starwars.ratelimit import RateLimiter
+from starwars.tables import IncrementalTable, PeopleTable
+from starwars.transforms import (
+    normalize_loaded_people_table_parameters,
+    transform_extracted_people_table,
+    transform_loaded_people_table,
+)
+
+logger = logging.getLogger(__name__)
+
+DATASET_CACHE_ALIAS = 'datasets'
+# Number of rows stored in a single entry of the datasets cache.
+CACHED_ROWS_CHUNK_SIZE = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def get_session_maker() -> PooledSessionMaker:
+    """Get session maker shared by all clients in the process.
+
+    Returns:
+        Session maker configured in settings.
+
+    """
+    return PooledSessionMaker(
+        pool_connections=settings.SWAPI_POOL_CONNECTIONS,
+        pool_maxsize=settings.SWAPI_POOL_MAXSIZE,
+        pool_block=settings.SWAPI_POOL_BLOCK,
+        max_retries=settings.SWAPI_MAX_RETRIES,
+        keep_alive=settings.SWAPI_KEEP_ALIVE,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Get rate limiter shared by all clients in the process.
 
-from starwars.client import StarWarsClient
-from starwars.models import Dataset
-from starwars.tables import PeopleTable
-from starwars.transforms import transform_extracted_people_table
+    Returns:
+        Rate limiter configured in settings, or ``None`` when requests
+        should not be limited.
 
+    """
+    if not settings.SWAPI_RATE_LIMIT:
+        return None
+    return RateLimiter(
+        rate=settings.SWAPI_RATE_LIMIT,
+        burst=settings.SWAPI_RATE_LIMIT_BURST,
+        max_concurrency=settings.SWAPI_MAX_CONCURRENCY,
+        max_retries=settings.SWAPI_RATE_LIMIT_RETRIES,
+    )
+
+
+def create_client() -> StarWarsClient:
+    """Create Star Wars API client configured in settings.
 
-def fetch_table_csv(client: StarWarsClient) -> bytes:
-    table = PeopleTable(client, initial_url=settings.DATASET_FETCH_URL)
-    transformed_table = transform_extracted_people_table(table, client)
-    source = petl.MemorySource()
-    petl.tocsv(transformed_table, source)
-    return source.getvalue()
+    All clients share the pooled session of ``get_session_maker()``, so
+    connections are kept alive between fetches, and the rate limiter of
+    ``get_rate_limiter()``, so they all stay within the API rate limit.
 
+    Returns:
+        Star Wars API client.
 
-@transaction.atomic
-def fetch_dataset(client: StarWarsClient) -> Dataset:
-    dataset = Dataset.objects.create()
-    csv_table = fetch_table_csv(client)
-    dataset.file.save(
-        name=f'{dataset.uuid!s}.csv',
-        content=ContentFile(csv_table),
+    """
+    response_cache = None
+    if settings.SWAPI_RESPONSE_CACHE_DIR:
+        response_cache = ResponseCache(
+            settings.SWAPI_RESPONSE_CACHE_DIR,
+            max_entries=settings.SWAPI_RESPONSE_CACHE_MAX_ENTRIES,
+        )
+    return StarWarsClient(
+        session_maker=get_session_maker(),
+        response_cache=response_cache,
+        timeout=(settings.SWAPI_CONNECT_TIMEOUT, settings.SWAPI_READ_TIMEOUT),
+        keep_session=True,
+        rate_limiter=get_rate_limiter(),
     )
+
+
+def get_previous_dataset() -> Optional[Dataset]:
+    """Get the latest dataset that can be refreshed incrementally.
+
+    Returns:
+        The latest done dataset, or ``None`` when there is no such dataset
+        or it has no records stored.
+
+    """
+    dataset = Dataset.objects.filter(
+        status=Dataset.Status.DONE,
+    ).order_by('-date').first()
+    if dataset is None or not dataset.records:
+        return None
     return dataset
+
+
+def load_previous_rows(
+    dataset: Dataset
+) -> Tuple[Optional[ColumnarTable], Dict[str, Tuple[str, int]]]:
+    """Load transformed rows of a dataset, keyed by URLs of the people.
+
+    Rows are not read here: they are read from the columnar file of
+    the dataset by their indices, as they are reused. Datasets without
+    a columnar file are not reused.
+
+    Args:
+        dataset: Dataset with stored records.
+
+    Returns:
+        Tuple of the columnar table of the dataset and a mapping of people
+        URLs to tuples of their ``edited`` timestamps and indices of their
+        rows in the table, see ``IncrementalTable``.
+
+    """
+    if not dataset.columns:
+        return None, {}
+    table = load_dataset_table(dataset)
+    if table.columns.rows != len(dataset.records):
+        logger.warning('Records of dataset %s do not match', dataset.uuid)
+        return None, {}
+    return table, {
+        url: (edited, index)
+        for index, (url, edited) in enumerate(dataset.records)
+    }
+
+
+@contextlib.contextmanager
+def fetch_table_csv(
+    client: StarWarsClient,
+    progress: Callable[[int, Optional[int]], None] = None,
+    previous: Dataset = None,
+    records: List[Tuple[str, str]] = None,
+    timings: Timings = None
+) -> ContextManager[File]:
+    """Fetch transformed people table into a temporary CSV file.
+
+    Rows are streamed from the pipeline straight to the file, so memory usage
+    does not depend on the size of the table. The file is removed on exit.
+
+    When ``records`` is given, the table is transformed incrementally: people
+    whose ``edited`` timestamp has not changed since the ``previous``
+    dataset reuse its rows, so homeworlds are resolved only for new and
+    changed people.
+
+    Args:
+        client: Star Wars API client to fetch the table with.
+        progress: Callable reporting fetched pages, see ``PeopleTable``.
+        previous: Dataset to reuse unchanged rows from.
+        records: List filled with URLs and ``edited`` timestamps of people
+            in the file, to be stored with the dataset.
+        timings: Timings to add time spent in the stages of the pipeline to:
+            waiting for pages (``fetch``), resolving homeworlds
+            (``planets``), transforming rows (``transform``) and writing
+            the CSV file (``serialize``).
+
+    Yields:
+        The CSV file, opened for reading in binary mode.
+
+    """
+    table = PeopleTable(
+        client,
+        initial_url=settings.DATASET_FETCH_URL,
+        max_workers=settings.DATASET_FETCH_CONCURRENCY,
+        progress=progress,
+        timings=timings,
+    )
+    transform = functools.partial(
+        transform_extracted_people_table,
+        client=client,
+        max_workers=settings.DATASET_PLANET_FETCH_CONCURRENCY,
+        timings=timings,
+    )
+    if records is None:
+        transformed_table = transform(table)
+    else:
+        previous_table, previous_rows = None, {}
+        if previous is not None:
+            previous_table, previous_rows = load_previous_rows(previous)
+        transformed_table = IncrementalTable(
+            table,
+            transform,
+            previous=previous_rows,
+            previous_table=previous_table,
+            records=records,
+        )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = pathlib.Path(temp_dir).joinpath('people.csv')
+        time_start = time.perf_counter()
+        petl.tocsv(transformed_table, str(path))
+        if timings is not None:
+            # The stages before are run as the rows are written.
+            timings.add('serialize', (
+                time.perf_counter() - time_start
+                - timings.seconds('fetch', 'planets', 'transform')
+            ))
+        with open(path, 'rb') as csv_file:
+            yield File(csv_file)
+
+
+def file_checksum(file: File) -> str:
+    """Compute SHA-256 checksum of a file, reading it in chunks.
+
+    Args:
+        file: File to compute the checksum of.
+
+    Returns:
+        Hex digest of the file content.
+
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+COMPRESSED_EXTENSIONS = {
+    'gzip': '.csv.gz',
+}
+
+
+def get_dataset_compression() -> Optional[str]:
+    """Get compression of stored CSV files, see ``DATASET_COMPRESSION``.
+
+    Returns:
+        Name of the compression, or ``None`` when files are not compressed.
+
+    Raises:
+        ImproperlyConfigured: when the compression is not supported.
+
+    """
+    compression = settings.DATASET_COMPRESSION
+    if compression is not None and compression not in COMPRESSED_EXTENSIONS:
+        supported = ', '.join(repr(name) for name in COMPRESSED_EXTENSIONS)
+        raise ImproperlyConfigured(
+            f'Unsupported DATASET_COMPRESSION {compression!r}, '
+            f'use one of {supported} or None'
+        )
+    return compression
+
+
+class DatasetFileSource:
+    """Source of ``petl.fromcsv()`` reading the CSV file of a dataset.
+
+    Compressed files are decompressed as they are read, so they are never
+    decompressed as a whole, neither in memory nor on disk.
+
+    Args:
+        file: The dataset file, e.g. ``Dataset.file``.
+
+    """
+
+    def __init__(self, file: File):
+        self.file = file
+
+    @contextlib.contextmanager
+    def open(self, mode: str = 'rb') -> ContextManager[BinaryIO]:
+        with self.file.open('rb') as file:
+            if self.file.name.endswith('.gz'):
+                with gzip.GzipFile(fileobj=file, mode='rb') as gzip_file:
+                    yield gzip_file
+            else:
+                yield file
+
+
+def compress_file(file: File, compression: str) -> File:
+    """Compress a file into a temporary file.
+
+    Args:
+        file: File to compress.
+        compression: Name of the compression, ``gzip``.
+
+    Returns:
+        Compressed file, removed when closed.
+
+    Raises:
+        ValueError: when the compression is not supported.
+
+    """
+    if compression != 'gzip':
+        raise ValueError(f'unsupported compression: {compression}')
+    compressed_file = tempfile.TemporaryFile()
+    file.seek(0)
+    # Fixed mtime keeps compressed files of the same content identical.
+    with gzip.GzipFile(fileobj=compressed_file, mode='wb', mtime=0) as gz:
+        shutil.copyfileobj(file, gz)
+    compressed_file.seek(0)
+    return File(compressed_file)
+
+
+def save_blob(storage: Storage, name: str, content: File) -> str:
+    """Save a content-addressed file under given name.
+
+    When another worker saves the same content in the meantime, the storage
+    saves the file under an alternative name. The file under the given name
+    has the same content, so the duplicate is deleted.
+
+    Args:
+        storage: Storage to save the file in.
+        name: Name derived from the content, see ``blob_destination()``.
+        content: File to save.
+
+    Returns:
+        The given name.
+
+    """
+    saved_name = storage.save(name, content)
+    if saved_name != name:
+        storage.delete(saved_name)
+    return name
+
+
+def save_dataset_file(
+    dataset: Dataset,
+    csv_file: File,
+    heartbeat: Callable[[], None] = None
+):
+    """Save CSV file as the file of a dataset and mark the dataset as done.
+
+    Files are stored by their content: the CSV file is saved under its
+    checksum, and not saved at all when a file with the same content already
+    exists, so datasets with identical content share one file. The dataset
+    is also stored in the columnar format, which is read when the dataset is
+    explored. It's derived from the CSV file, so it's shared the same way,
+    and the schema of its columns is stored on the dataset. The dataset
+    itself is not saved.
+
+    The CSV file is compressed when ``DATASET_COMPRESSION`` is set. Its
+    checksum is computed from the uncompressed content either way.
+
+    Args:
+        dataset: Dataset to save the file for.
+        csv_file: CSV file with the transformed people table.
+        heartbeat: Callable without arguments called before each step of
+            storing the file, so a long store is not taken for a dead job.
+
+    Raises:
+        ImproperlyConfigured: when ``DATASET_COMPRESSION`` is not supported.
+
+    """
+    compression = get_dataset_compression()
+    beat = heartbeat or (lambda: None)
+    beat()
+    dataset.checksum = file_checksum(csv_file)
+    beat()
+    storage = dataset.file.storage
+    names = [
+        blob_destination(dataset.checksum, extension)
+        for extension in ('.csv', *COMPRESSED_EXTENSIONS.values())
+    ]
+    name = next((name for name in names if storage.exists(name)), None)
+    if name is None and compression:
+        name = blob_destination(
+            dataset.checksum,
+            COMPRESSED_EXTENSIONS[compression],
+        )
+        with compress_file(csv_file, compression) as compressed_file:
+            name = save_blob(storage, name, compressed_file)
+    elif name is None:
+        name = save_blob(storage, names[0], csv_file)
+    dataset.file.name = name
+
+    name = blob_destination(dataset.checksum, '.swcol')
+    if storage.exists(name):
+        dataset.columns.name = name
+        dataset.schema = ColumnarFile.open(dataset.columns).schema
+    else:
+        beat()
+        with tempfile.TemporaryFile() as columns_file:
+            dataset.schema = write_columns(
+                petl.fromcsv(DatasetFileSource(dataset.file)),
+                columns_file,
+            )
+            columns_file.seek(0)
+            dataset.columns.name = save_blob(storage, name, File(columns_file))
+    dataset.status = Dataset.Status.DONE
+
+
+def load_dataset_table(dataset: Dataset) -> petl.Table:
+    """Load table of a dataset from the storage.
+
+    The columnar file is read when the dataset has one, so no CSV parsing
+    is needed. Older datasets are read from their CSV files.
+
+    Args:
+        dataset: Dataset to load the table of.
+
+    Returns:
+        ETL table with the dataset rows.
+
+    """
+    if dataset.columns:
+        return ColumnarTable(ColumnarFile.open(dataset.columns))
+    return petl.fromcsv(DatasetFileSource(dataset.file))
+
+
+def transformed_rows_cache_key(
+    dataset: Dataset,
+    aggregate_by: Tuple[str, ...],
+    order_by: Optional[str]
+) -> str:
+    """Get key of transformed dataset rows in the datasets cache.
+
+    Rows are keyed by the checksum of the dataset file, so datasets with
+    identical content share them. Datasets saved without a checksum are
+    keyed by their UUID.
+
+    Args:
+        dataset: Dataset the rows are transformed from.
+        aggregate_by: Normalized field names to aggregate by.
+        order_by: Normalized Django-style ordering value.
+
+    Returns:
+        Cache key for the transformed rows.
+
+    """
+    parameters = json.dumps([aggregate_by, order_by])
+    digest = hashlib.sha256(parameters.encode('utf-8')).hexdigest()
+    return f'dataset-rows:{dataset.checksum or dataset.uuid!s}:{digest}'
+
+
+def get_transformed_rows(
+    dataset: Dataset,
+    table: petl.Table,
+    aggregate_by: Iterable[str] = None,
+    order_by: str = None,
+    limit: int = None,
+    offset: int = 0
+) -> Tuple[tuple, List[tuple]]:
+    """Get a page of rows of an aggregated and sorted dataset table.
+
+    Rows which are not aggregated are not cached: columnar tables read them
+    straight from the sort order indexes of the columnar file, so only
+    the rows of the page are decoded, however far the page is, and other
+    tables select the first rows up to the page with a bounded heap instead
+    of sorting all of them. Aggregated rows never change once the dataset
+    is written, so they are computed once per normalized set of parameters
+    and then read from the datasets cache, see ``get_cached_rows()``, unless
+    there are more of them than ``DATASET_CACHE_MAX_ROWS``.
+
+    Args:
+        dataset: Dataset the table has been loaded for.
+        table: ETL table loaded with ``load_dataset_table()``.
+        aggregate_by: Field names to aggregate by.
+        order_by: Django-style field name ordering value.
+        limit: Maximum number of returned rows. No limit when ``None``.
+        offset: Number of first rows to skip.
+
+    Returns:
+        Tuple of the transformed table header and its rows.
+
+    """
+    aggregate_by, order_by = normalize_loaded_people_table_parameters(
+        petl.header(table),
+        aggregate_by=aggregate_by,
+        order_by=order_by,
+    )
+    if not aggregate_by:
+        transformed_table = transform_loaded_people_table(
+            table,
+            order_by=order_by,
+            limit=limit,
+            offset=offset,
+        )
+        it = iter(transformed_table)
+        return tuple(next(it)), [tuple(row) for row in it]
+    key = transformed_rows_cache_key(dataset, aggregate_by, order_by)
+    stop = offset + limit if limit is not None else None
+    cached = get_cached_rows(key, offset, stop)
+    if cached is not None:
+        return cached
+    transformed_table = transform_loaded_people_table(
+        table,
+        aggregate_by=aggregate_by,
+        order_by=order_by,
+    )
+    it = iter(transformed_table)
+    header = tuple(next(it))
+    rows = [tuple(row) for row in it]
+    if len(rows) <= settings.DATASET_CACHE_MAX_ROWS:
+        set_cached_rows(key, header, rows)
+    return header, rows[offset:stop]
+
+
+def get_cached_rows(
+    key: str,
+    start: int,
+    stop: Optional[int]
+) -> Optional[Tuple[tuple, List[tuple]]]:
+    """Get a range of transformed rows from the datasets cache.
+
+    Rows are cached in chunks of ``CACHED_ROWS_CHUNK_SIZE`` rows, next to
+    the header and the number of rows, so only the chunks of the range are
+    read (and unpickled), however many rows there are.
+
+    Args:
+        key: Cache key of the rows, see ``transformed_rows_cache_key()``.
+        start: Index of the first row.
+        stop: Index after the last row. All the rows when ``None``.
+
+    Returns:
+        Tuple of the header and the rows, or ``None`` when the rows (or any
+        of the needed chunks) are not cached.
+
+    """
+    cache = caches[DATASET_CACHE_ALIAS]
+    cached = cache.get(key, None)
+    if cached is None:
+        return None
+    header, count = cached
+    stop = count if stop is None else min(stop, count)
+    if start >= stop:
+        return header, []
+    first_chunk = start // CACHED_ROWS_CHUNK_SIZE
+    last_chunk = (stop - 1) // CACHED_ROWS_CHUNK_SIZE
+    keys = [
+        f'{key}:{chunk}' for chunk in range(first_chunk, last_chunk + 1)
+    ]
+    chunks = cache.get_many(keys)
+    if len(chunks) < len(keys):
+        return None
+    rows = list(itertools.chain.from_iterable(chunks[key] for key in keys))
+    first_row = first_chunk * CACHED_ROWS_CHUNK_SIZE
+    return header, rows[start - first_row:stop - first_row]
+
+
+def set_cached_rows(key: str, header: tuple, rows: List[tuple]):
+    """Store transformed rows in the datasets cache.
+
+    Args:
+        key: Cache key of the rows, see ``transformed_rows_cache_key()``.
+        header: Header of the transformed table.
+        rows: All the transformed rows.
+
+    """
+    entries = {key: (header, len(rows))}
+    for chunk, start in enumerate(range(0, len(rows), CACHED_ROWS_CHUNK_SIZE)):
+        entries[f'{key}:{chunk}'] = rows[start:start + CACHED_ROWS_CHUNK_SIZE]
+    caches[DATASET_CACHE_ALIAS].set_many(entries)
+
+
+class _Echo:
+    """File-like object returning written lines instead of storing them."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv_lines(table: petl.Table) -> Iterator[str]:
+    """Iterate over lines of a table in the CSV format.
+
+    Lines are produced as rows are read from the table, so a table of any
+    size can be streamed without buffering it.
+
+    Args:
+        table: ETL table to export.
+
+    Returns:
+        Iterator over lines of the CSV file, including the header.
+
+    """
+    writer = csv.writer(_Echo())
+    return (writer.writerow(row) for row in table)
+
+
+def iter_ndjson_lines(table: petl.Table) -> Iterator[str]:
+    """Iterate over rows of a table as newline-delimited JSON objects.
+
+    Args:
+        table: ETL table to export.
+
+    Yields:
+        JSON objects mapping field names to values, one per line.
+
+    """
+    it = iter(table)
+    try:
+        header = tuple(next(it))
+    except StopIteration:
+        return
+    for row in it:
+        yield json.dumps(dict(zip(header, row))) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', iter_csv_lines),
+    'ndjson': ('application/x-ndjson', iter_ndjson_lines),
+}
+
+
+def submit_fetch_job() -> Dataset:
+    """Submit a job fetching a new dataset.
+
+    The job is run by the ``fetch_worker`` management command.
+
+    Returns:
+        Pending dataset the job will fetch.
+
+    """
+    return Dataset.objects.create(status=Dataset.Status.PENDING)
+
+
+def fail_stale_fetch_jobs() -> int:
+    """Mark running fetch jobs whose worker stopped responding as failed.
+
+    Workers store a heartbeat on the dataset when they claim a job, after
+    each fetched page and while storing the dataset file. A job without
+    a heartbeat for longer than ``DATASET_JOB_TIMEOUT`` seconds is assumed
+    to be abandoned by a worker that died, so it would otherwise stay
+    running forever.
+
+    Returns:
+        Number of jobs marked as failed.
+
+    """
+    timeout = timedelta(seconds=settings.DATASET_JOB_TIMEOUT)
+    return Dataset.objects.filter(
+        Q(heartbeat__isnull=True) | Q(heartbeat__lt=timezone.now() - timeout),
+        status=Dataset.Status.RUNNING,
+    ).update(
+        status=Dataset.Status.FAILED,
+        error='The worker running the job stopped responding.',
+    )
+
+
+def claim_fetch_job() -> Optional[Dataset]:
+    """Claim the oldest pending fetch job.
+
+    The job is claimed with a conditional update, so it's never claimed by
+    more than one worker at the same time. Stale running jobs are failed
+    first, see ``fail_stale_fetch_jobs()``.
+
+    Returns:
+        Dataset to fetch, or ``None`` when there are no pending jobs.
+
+    """
+    fail_stale_fetch_jobs()
+    pending = Dataset.objects.filter(status=Dataset.Status.PENDING)
+    for dataset in pending.order_by('date'):
+        heartbeat = timezone.now()
+        claimed = Dataset.objects.filter(
+            pk=dataset.pk,
+            status=Dataset.Status.PENDING,
+        ).update(status=Dataset.Status.RUNNING, heartbeat=heartbeat)
+        if claimed:
+            dataset.status = Dataset.Status.RUNNING
+            dataset.heartbeat = heartbeat
+            return dataset
+    return None
+
+
+def run_fetch_job(dataset: Dataset, client: StarWarsClient) -> Dataset:
+    """Fetch the dataset of a claimed job.
+
+    Progress is stored on the dataset after each fetched page, so it can be
+    displayed while the job is running, along with a heartbeat telling the
+    job is still alive. Heartbeats are also sent while the file is stored.
+    The dataset is marked as failed when it could not be fetched. The result
+    is saved only while the job is still running, so a job failed by
+    ``fail_stale_fetch_jobs()`` in the meantime is not resurrected. Time
+    spent in each stage of the fetch is stored on the dataset, see
+    ``fetch_table_csv()``. Unless disabled with ``DATASET_INCREMENTAL_FETCH``,
+    rows of people that have not changed are reused from the latest done
+    dataset.
+
+    Args:
+        dataset: Dataset claimed by ``claim_fetch_job()``.
+        client: Star Wars API client to fetch the dataset with.
+
+    Returns:
+        The fetched (or failed) dataset.
+
+    """
+    running = Dataset.objects.filter(
+        pk=dataset.pk,
+        status=Dataset.Status.RUNNING,
+    )
+
+    def send_heartbeat(**fields):
+        dataset.heartbeat = timezone.now()
+        running.update(heartbeat=dataset.heartbeat, **fields)
+
+    def report_progress(pages_done: int, pages_total: Optional[int]):
+        dataset.pages_done = pages_done
+        dataset.pages_total = pages_total
+        send_heartbeat(pages_done=pages_done, pages_total=pages_total)
+
+    previous = None
+    if settings.DATASET_INCREMENTAL_FETCH:
+        previous = get_previous_dataset()
+    records = []
+    timings = Timings()
+    time_start = time.monotonic()
+    try:
+        with fetch_table_csv(
+            client,
+            progress=report_progress,
+            previous=previous,
+            records=records,
+            timings=timings,
+        ) as csv_file:
+            with timings.time('store'):
+                save_dataset_file(dataset, csv_file, send_heartbeat)
+        dataset.records = records
+    except Exception as e:
+        logger.exception('Could not fetch dataset %s', dataset.uuid)
+        dataset.status = Dataset.Status.FAILED
+        dataset.error = str(e)
+    dataset.duration = timedelta(seconds=time.monotonic() - time_start)
+    dataset.timings = timings.as_dict()
+    saved = running.update(
+        status=dataset.status,
+        file=dataset.file.name,
+        columns=dataset.columns.name,
+        schema=dataset.schema,
+        records=dataset.records,
+        checksum=dataset.checksum,
+        duration=dataset.duration,
+        timings=dataset.timings,
+        error=dataset.error,
+    )
+    if not saved:
+        logger.warning(
+            'Dataset %s is no longer running, its result is discarded',
+            dataset.uuid,
+        )
+        dataset.refresh_from_db()
+    return dataset
+
+
+FETCH_STAGES = ('fetch', 'planets', 'transform', 'serialize', 'store')
+
+
+def timings_value(group: str, name: str, output_field: Field) -> Cast:
+    """Get expression of a value stored in timings of a dataset.
+
+    Args:
+        group: Group of the value, ``seconds`` or ``counts``.
+        name: Name of the stage or of the counted operations.
+        output_field: Field of the value type.
+
+    Returns:
+        Expression of the value, null when it's missing.
+
+    """
+    return Cast(
+        KeyTextTransform(name, KeyTransform(group, 'timings')),
+        output_field,
+    )
+
+
+def histogram_aggregates(
+    name: str,
+    lookup: str,
+    value: Expression,
+    buckets: Sequence[float],
+    bound: Callable[[float], Any] = float
+) -> Dict[str, Aggregate]:
+    """Get aggregates computing a histogram of a field in the database.
+
+    Args:
+        name: Prefix of the aggregate names.
+        lookup: Lookup of the observed field, e.g. ``duration``.
+        value: Expression of the observed value, to be summed.
+        buckets: Upper bounds of the buckets, without ``+Inf``.
+        bound: Callable converting a bucket bound to the field type.
+
+    Returns:
+        Aggregates of cumulative bucket counts (``<name>_<index>``),
+        the number of observations (``<name>_count``) and their sum
+        (``<name>_sum``).
+
+    """
+    aggregates = {
+        f'{name}_{index}': Count(
+            'pk',
+            filter=Q(**{f'{lookup}__lte': bound(upper_bound)}),
+        )
+        for index, upper_bound in enumerate(buckets)
+    }
+    aggregates[f'{name}_count'] = Count(
+        'pk',
+        filter=Q(**{f'{lookup}__isnull': False}),
+    )
+    aggregates[f'{name}_sum'] = Sum(value)
+    return aggregates
+
+
+def collect_metrics() -> Registry:
+    """Collect metrics of fetch jobs from timings stored on datasets.
+
+    Jobs are run by worker processes, so the metrics are collected from
+    the database rather than from the process serving them. They are
+    aggregated by the database, with two queries per scrape.
+
+    Returns:
+        Registry of the metrics, to be rendered on the metrics endpoint.
+
+    """
+    registry = Registry()
+    jobs = registry.counter(
+        'starwars_fetch_jobs_total',
+        'Finished dataset fetch jobs.',
+        labelnames=('status',),
+    )
+    stage_seconds = registry.histogram(
+        'starwars_fetch_stage_seconds',
+        'Time spent in stages of dataset fetch jobs.',
+        labelnames=('stage',),
+    )
+    duration_seconds = registry.histogram(
+        'starwars_fetch_duration_seconds',
+        'Total time of dataset fetch jobs.',
+    )
+    pages = registry.counter(
+        'starwars_people_pages_fetched_total',
+        'Pages of people fetched from Star Wars API.',
+    )
+    planet_lookups = registry.counter(
+        'starwars_planet_lookups_total',
+        'Lookups of homeworld planets, by the planets cache result.',
+        labelnames=('result',),
+    )
+    datasets = Dataset.objects.filter(
+        status__in=(Dataset.Status.DONE, Dataset.Status.FAILED),
+    )
+    statuses = datasets.order_by().values('status').annotate(jobs=Count('pk'))
+    for row in statuses:
+        jobs.inc(row['jobs'], status=row['status'])
+
+    buckets = duration_seconds.buckets[:-1]
+    aggregates = histogram_aggregates(
+        'duration',
+        'duration',
+        F('duration'),
+        buckets,
+        bound=lambda seconds: timedelta(seconds=seconds),
+    )
+    for stage in FETCH_STAGES:
+        aggregates.update(histogram_aggregates(
+            stage,
+            f'timings__seconds__{stage}',
+            timings_value('seconds', stage, FloatField()),
+            buckets,
+        ))
+    for name in ('pages', 'planet_cache_hits', 'planet_cache_misses'):
+        aggregates[name] = Sum(timings_value('counts', name, IntegerField()))
+    totals = datasets.aggregate(**aggregates)
+
+    def observations(name: str) -> List[int]:
+        return [
+            *(totals[f'{name}_{index}'] for index in range(len(buckets))),
+            totals[f'{name}_count'],
+        ]
+
+    duration = totals['duration_sum'] or timedelta()
+    duration_seconds.set(observations('duration'), duration.total_seconds())
+    for stage in FETCH_STAGES:
+        if totals[f'{stage}_count']:
+            stage_seconds.set(
+                observations(stage),
+                totals[f'{stage}_sum'],
+                stage=stage,
+            )
+    pages.inc(totals['pages'] or 0)
+    planet_lookups.inc(totals['planet_cache_hits'] or 0, result='hit')
+    planet_lookups.inc(totals['planet_cache_misses'] or 0, result='miss')
+    return registry
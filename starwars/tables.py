@@ -1,29 +1,325 @@
+import collections
+import heapq
+import itertools
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Hashable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
+
 import petl
+from petl.comparison import comparable_itemgetter
+from petl.util.base import asindices
 
 from starwars.client import StarWarsClient
+from starwars.columnar import ColumnarTable
+from starwars.metrics import Timings
+
+
+def page_url(url: str, page: int) -> str:
+    """Replace the ``page`` query parameter of given URL.
+
+    Args:
+        url: URL of any page of a paginated endpoint.
+        page: Number of the page to build URL for.
+
+    Returns:
+        URL of the requested page.
+
+    """
+    parts = urlsplit(url)
+    query = parse_qs(parts.query, keep_blank_values=True)
+    query['page'] = [str(page)]
+    return urlunsplit(parts._replace(query=urlencode(query, doseq=True)))
+
+
+def remaining_page_urls(people_page: Mapping) -> Optional[List[str]]:
+    """Determine URLs of all pages that follow given page.
+
+    The URLs are computed from the ``count`` field, the number of results on
+    the page and the ``page`` query parameter of the ``next`` link.
+
+    Args:
+        people_page: First page of people returned by Star Wars API.
+
+    Returns:
+        URLs of remaining pages in order, or ``None`` when they cannot be
+        determined from the page.
+
+    """
+    next_url = people_page.get('next', None)
+    if not next_url:
+        return []
+    count = people_page.get('count', None)
+    page_size = len(people_page.get('results', []))
+    try:
+        next_page = int(parse_qs(urlsplit(next_url).query)['page'][0])
+    except (KeyError, ValueError):
+        return None
+    if not isinstance(count, int) or not page_size:
+        return None
+    last_page = math.ceil(count / page_size)
+    return [
+        page_url(next_url, page)
+        for page in range(next_page, last_page + 1)
+    ]
 
 
 class PeopleTable(petl.Table):
     """ETL table for people objects from Star Wars API.
 
+    When ``max_workers`` is greater than one, URLs of all pages are determined
+    from the first page and the remaining pages are fetched concurrently.
+    Rows are returned in the original page order either way.
+
     Args:
         client: Star Wars API client.
+        initial_url: URL of the first page of people.
+        max_workers: Maximum number of pages fetched at the same time.
+        progress: Callable called after each page with the number of pages
+            fetched so far and the total number of pages (``None`` when
+            unknown).
+        timings: Timings to add the time spent waiting for pages to (as
+            the ``fetch`` stage) and the number of fetched ``pages`` to.
 
     """
-    def __init__(self, client: StarWarsClient, initial_url: str):
+    def __init__(
+        self,
+        client: StarWarsClient,
+        initial_url: str,
+        max_workers: int = 1,
+        progress: Callable[[int, Optional[int]], None] = None,
+        timings: Timings = None
+    ):
         self.client = client
         self.initial_url = initial_url
+        self.max_workers = max_workers
+        self.progress = progress
+        self.timings = timings
 
     def __iter__(self):
-        next_url = self.initial_url
         header_returned = False
+        pages_total = None
         with self.client as client:
-            while next_url:
-                people_page = client.get(next_url)
+            pages = self._iter_pages(client)
+            if self.timings is not None:
+                pages = self._iter_timed(pages)
+            pages = enumerate(pages, start=1)
+            for pages_done, people_page in pages:
+                if self.progress is not None:
+                    if pages_done == 1:
+                        urls = remaining_page_urls(people_page)
+                        if urls is not None:
+                            pages_total = len(urls) + 1
+                    self.progress(pages_done, pages_total)
                 for person in people_page.get('results', []):
                     if not header_returned:
                         yield tuple(person.keys())
                         header_returned = True
                     yield tuple(person.values())
+
+    def _iter_timed(self, pages: Iterator[Mapping]) -> Iterator[Mapping]:
+        while True:
+            with self.timings.time('fetch'):
+                people_page = next(pages, None)
+            if people_page is None:
+                return
+            self.timings.count('pages')
+            yield people_page
+
+    def _iter_pages(self, client: StarWarsClient) -> Iterator[Mapping]:
+        people_page = client.get(self.initial_url)
+        yield people_page
+        urls = None
+        if self.max_workers > 1:
+            urls = remaining_page_urls(people_page)
+        if urls is None:
+            next_url = people_page.get('next', None)
+            while next_url:
+                people_page = client.get(next_url)
+                yield people_page
                 next_url = people_page.get('next', None)
+        else:
+            yield from self._iter_pages_concurrently(client, urls)
+
+    def _iter_pages_concurrently(
+        self,
+        client: StarWarsClient,
+        urls: List[str]
+    ) -> Iterator[Mapping]:
+        # Only a window of ``max_workers`` pages is requested ahead of the
+        # consumer, so stopping the iteration early does not fetch everything.
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            urls = iter(urls)
+            pending = collections.deque(
+                executor.submit(client.get, url)
+                for url in itertools.islice(urls, self.max_workers)
+            )
+            while pending:
+                people_page = pending.popleft().result()
+                url = next(urls, None)
+                if url is not None:
+                    pending.append(executor.submit(client.get, url))
+                yield people_page
+
+
+class IncrementalTable(petl.Table):
+    """ETL table transforming only new and changed records of a table.
+
+    Records are identified by the ``key_field`` and their versions are
+    compared by the ``version_field``. Records with the same version as in
+    ``previous`` reuse their previously transformed rows, and the remaining
+    records are transformed with ``transform`` in batches. Rows are returned
+    in the order of the source table either way.
+
+    Reused rows are read from ``previous_table`` batch by batch, so previous
+    rows are never all held in memory. Nothing is reused when the header of
+    ``previous_table`` differs from the header of the transformed table,
+    e.g. after the transform has changed.
 
+    Args:
+        table: ETL table with extracted records.
+        transform: Callable transforming an ETL table of extracted records
+            into an ETL table with the same number of rows.
+        previous: Mapping of keys of previously transformed records to
+            tuples of their versions and indices of their rows in
+            ``previous_table``.
+        previous_table: Columnar table with previously transformed rows.
+        records: List filled with ``(key, version)`` pairs of the returned
+            rows on iteration, to be stored for the next refresh.
+        key_field: Name of the field identifying records.
+        version_field: Name of the field with versions of records.
+        batch_size: Maximum number of rows in a batch.
+
+    """
+    def __init__(
+        self,
+        table: petl.Table,
+        transform: Callable[[petl.Table], petl.Table],
+        previous: Mapping[Hashable, Tuple[Any, int]],
+        previous_table: ColumnarTable = None,
+        records: List[Tuple[Any, Any]] = None,
+        key_field: str = 'url',
+        version_field: str = 'edited',
+        batch_size: int = 1000
+    ):
+        self.table = table
+        self.transform = transform
+        self.previous = previous
+        self.previous_table = previous_table
+        self.records = records
+        self.key_field = key_field
+        self.version_field = version_field
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        if self.records is not None:
+            self.records.clear()
+        it = iter(self.table)
+        try:
+            header = tuple(next(it))
+        except StopIteration:
+            return
+        transformed_header = tuple(petl.header(self.transform(
+            petl.wrap([header])
+        )))
+        yield transformed_header
+        previous = self.previous
+        if (
+            self.previous_table is None
+            or tuple(petl.header(self.previous_table)) != transformed_header
+        ):
+            previous = {}
+        key_index = header.index(self.key_field)
+        version_index = header.index(self.version_field)
+        while True:
+            rows = list(itertools.islice(it, self.batch_size))
+            if not rows:
+                break
+            records = [
+                (row[key_index], row[version_index]) for row in rows
+            ]
+            indices = [
+                self._previous_index(previous, *record) for record in records
+            ]
+            changed = [
+                row for row, index in zip(rows, indices) if index is None
+            ]
+            transformed = iter(())
+            if changed:
+                transformed = itertools.islice(
+                    self.transform(petl.wrap([header, *changed])),
+                    1,
+                    None
+                )
+            reused = iter(())
+            if len(changed) < len(rows):
+                reused = self.previous_table.rows(
+                    index for index in indices if index is not None
+                )
+            for record, index in zip(records, indices):
+                if self.records is not None:
+                    self.records.append(record)
+                if index is None:
+                    yield tuple(next(transformed))
+                else:
+                    yield next(reused)
+
+    @staticmethod
+    def _previous_index(
+        previous: Mapping[Hashable, Tuple[Any, int]],
+        key: Hashable,
+        version: Any
+    ) -> Optional[int]:
+        if version is None or key not in previous:
+            return None
+        previous_version, index = previous[key]
+        return index if previous_version == version else None
+
+
+class SortedHeadTable(petl.Table):
+    """ETL table with first rows of a table sorted by given key.
+
+    Rows are selected with a bounded heap, so only ``limit`` rows are kept
+    in memory and the cost is O(n log k) instead of a full sort. The result
+    is the same as of ``petl.head(petl.sort(...), limit)``, including
+    the order of ties.
+
+    Args:
+        table: ETL table to select the rows from.
+        key: Field name (or names) to sort by.
+        limit: Number of rows to select.
+        reverse: Whether to sort in descending order.
+
+    """
+    def __init__(
+        self,
+        table: petl.Table,
+        key,
+        limit: int,
+        reverse: bool = False
+    ):
+        self.table = table
+        self.key = key
+        self.limit = limit
+        self.reverse = reverse
+
+    def __iter__(self):
+        it = iter(self.table)
+        try:
+            header = tuple(next(it))
+        except StopIteration:
+            return
+        yield header
+        getkey = comparable_itemgetter(*asindices(header, self.key))
+        select = heapq.nlargest if self.reverse else heapq.nsmallest
+        for row in select(self.limit, it, key=getkey):
+            yield tuple(row)
@@ -21,6 +21,7 @@ def query_string_order_by_toggle(request, field):
     else:
         order_by = field
     query_dict['order_by'] = order_by
+    query_dict.pop('offset', None)
     return query_dict.urlencode()
 
 
@@ -33,4 +34,5 @@ def query_string_list_toggle(request, key, value):
     else:
         lst.append(value)
     query_dict.setlist(key, lst)
+    query_dict.pop('offset', None)
     return query_dict.urlencode()
@@ -0,0 +1,182 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from starwars.async_client import AsyncPeopleTable, AsyncStarWarsClient
+from starwars.ratelimit import RateLimiter
+
+TEST_URL = 'http://swapi/api'
+
+
+def create_client(handler, rate_limiter=None):
+    return AsyncStarWarsClient(
+        session_maker=lambda: httpx.AsyncClient(
+            transport=httpx.MockTransport(handler)
+        ),
+        rate_limiter=rate_limiter,
+    )
+
+
+def throttled_handler(responses):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return responses[min(len(requests), len(responses)) - 1]
+
+    return handler, requests
+
+
+async def get(client, url, **kwargs):
+    async with client:
+        return await client.get(url, **kwargs)
+
+
+def test_get_calls_session_get_with_kwargs():
+    # given
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={})
+
+    client = create_client(handler)
+    # when
+    asyncio.run(get(client, TEST_URL, params={'page': 1}))
+    # then
+    assert str(requests[0].url) == f'{TEST_URL}?page=1'
+
+
+@pytest.mark.parametrize('status_code', [400, 429, 499, 500, 599])
+def test_get_raise_status_error_on_http_error(status_code):
+    # given
+    client = create_client(lambda request: httpx.Response(status_code))
+    # then
+    with pytest.raises(httpx.HTTPStatusError):
+        # when
+        asyncio.run(get(client, TEST_URL))
+
+
+def test_get_retries_throttled_request_with_rate_limiter():
+    # given
+    payload = {'test': True}
+    handler, requests = throttled_handler([
+        httpx.Response(429, headers={'Retry-After': '0'}),
+        httpx.Response(200, json=payload),
+    ])
+    rate_limiter = RateLimiter(rate=100, max_retries=1, backoff_base=0.001)
+    client = create_client(handler, rate_limiter=rate_limiter)
+    # when
+    result = asyncio.run(get(client, TEST_URL))
+    # then
+    assert result == payload
+    assert len(requests) == 2
+
+
+def test_get_raise_status_error_when_retries_exhausted():
+    # given
+    handler, requests = throttled_handler([
+        httpx.Response(429, headers={'Retry-After': '0'}),
+    ])
+    rate_limiter = RateLimiter(rate=100, max_retries=2, backoff_base=0.001)
+    client = create_client(handler, rate_limiter=rate_limiter)
+    # then
+    with pytest.raises(httpx.HTTPStatusError):
+        # when
+        asyncio.run(get(client, TEST_URL))
+    assert len(requests) == 3
+
+
+def test_get_does_not_count_failed_request_as_success():
+    # given
+    def handler(request):
+        raise httpx.ConnectError('refused', request=request)
+
+    rate_limiter = RateLimiter(rate=100, max_concurrency=8)
+    rate_limiter.concurrency = 1
+    client = create_client(handler, rate_limiter=rate_limiter)
+    # then
+    with pytest.raises(httpx.ConnectError):
+        # when
+        asyncio.run(get(client, TEST_URL))
+    assert rate_limiter.concurrency == 1
+    assert rate_limiter._in_flight == 0
+
+
+def test_default_session_bounds_connections():
+    # given
+    client = AsyncStarWarsClient(max_connections=4)
+    # when
+    session = client.default_session_maker()
+    # then
+    assert session._transport._pool._max_connections == 4
+    asyncio.run(session.aclose())
+
+
+def test_get_returns_json_payload():
+    # given
+    payload = {'test': True}
+    client = create_client(lambda request: httpx.Response(200, json=payload))
+    # when
+    result = asyncio.run(get(client, TEST_URL))
+    # then
+    assert result == payload
+
+
+def test_close_closes_session():
+    # given
+    client = create_client(lambda request: httpx.Response(200, json={}))
+    # when
+    asyncio.run(get(client, TEST_URL))
+    # then
+    with pytest.raises(AssertionError):
+        client.session
+
+
+def test_async_people_table_queries_pages_concurrently():
+    # given
+    people_url = f'{TEST_URL}/people/'
+    pages = {
+        people_url: {
+            'count': 4,
+            'next': f'{people_url}?page=2',
+            'results': [
+                {'name': 'Luke Skywalker', 'height': '172'},
+                {'name': 'C-3PO', 'height': '167'},
+            ],
+        },
+        f'{people_url}?page=2': {
+            'count': 4,
+            'next': None,
+            'results': [
+                {'name': 'R2-D2', 'height': '96'},
+                {'name': 'Darth Vader', 'height': '202'},
+            ],
+        },
+    }
+    client = AsyncStarWarsClient()
+    people_table = AsyncPeopleTable(
+        client=client,
+        initial_url=people_url,
+        max_concurrency=4
+    )
+
+    async def get(url):
+        return pages[url]
+
+    async def collect():
+        return [row async for row in people_table]
+
+    with patch.object(client, 'get', side_effect=get):
+        # when
+        rows = asyncio.run(collect())
+    # then
+    assert rows == [
+        ('name', 'height'),
+        ('Luke Skywalker', '172'),
+        ('C-3PO', '167'),
+        ('R2-D2', '96'),
+        ('Darth Vader', '202'),
+    ]
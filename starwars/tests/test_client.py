@@ -1,3 +1,4 @@
+import os
 from unittest.mock import Mock, patch
 
 import pytest
@@ -5,7 +6,16 @@ import requests
 import responses
 from requests import HTTPError
 
-from starwars.client import StarWarsClient, TooManyRequests
+from starwars.client import (
+    CachedResponse,
+    KeepAliveHTTPAdapter,
+    PooledSessionMaker,
+    ResponseCache,
+    StarWarsClient,
+    TooManyRequests,
+    parse_retry_after,
+)
+from starwars.ratelimit import RateLimiter
 
 TEST_URL = 'http://swapi/api'
 
@@ -67,3 +77,232 @@ def test_get_returns_json_payload(test_client):
     result = test_client.get(TEST_URL)
     # then
     assert result == payload
+
+
+@pytest.fixture
+def response_cache(tmp_path):
+    return ResponseCache(tmp_path)
+
+
+@pytest.fixture
+def caching_client(response_cache):
+    with StarWarsClient(response_cache=response_cache) as client:
+        yield client
+
+
+def test_response_cache_get_returns_stored_response(response_cache):
+    # given
+    cached = CachedResponse(payload={'test': True}, etag='"abc"')
+    response_cache.set(TEST_URL, cached)
+    # when
+    result = response_cache.get(TEST_URL)
+    # then
+    assert result == cached
+
+
+def test_response_cache_get_returns_none_when_not_stored(response_cache):
+    # when
+    result = response_cache.get(TEST_URL)
+    # then
+    assert result is None
+
+
+def test_response_cache_set_removes_least_recently_stored(tmp_path):
+    # given
+    response_cache = ResponseCache(tmp_path, max_entries=2)
+    urls = [f'{TEST_URL}/{index}' for index in range(3)]
+    for index, url in enumerate(urls[:2]):
+        response_cache.set(url, CachedResponse(payload=index, etag='"abc"'))
+        os.utime(response_cache._path(url), (index, index))
+    # when
+    response_cache.set(urls[2], CachedResponse(payload=2, etag='"abc"'))
+    # then
+    assert [response_cache.get(url) for url in urls] == [
+        None,
+        CachedResponse(payload=1, etag='"abc"'),
+        CachedResponse(payload=2, etag='"abc"'),
+    ]
+
+
+@responses.activate
+def test_get_stores_response_with_validators(caching_client, response_cache):
+    # given
+    payload = {'test': True}
+    responses.add(
+        responses.GET, TEST_URL, json=payload, headers={'ETag': '"abc"'}
+    )
+    # when
+    caching_client.get(TEST_URL)
+    # then
+    assert response_cache.get(TEST_URL) == CachedResponse(
+        payload=payload,
+        etag='"abc"',
+    )
+
+
+@responses.activate
+def test_get_does_not_store_response_without_validators(
+    caching_client,
+    response_cache
+):
+    # given
+    responses.add(responses.GET, TEST_URL, json={'test': True})
+    # when
+    caching_client.get(TEST_URL)
+    # then
+    assert response_cache.get(TEST_URL) is None
+
+
+@responses.activate
+def test_get_returns_cached_payload_when_not_modified(
+    caching_client,
+    response_cache
+):
+    # given
+    payload = {'test': True}
+    response_cache.set(TEST_URL, CachedResponse(
+        payload=payload,
+        etag='"abc"',
+        last_modified='Mon, 12 Jul 2021 10:05:00 GMT',
+    ))
+    responses.add(responses.GET, TEST_URL, status=304)
+    # when
+    result = caching_client.get(TEST_URL)
+    # then
+    assert result == payload
+    request_headers = responses.calls[0].request.headers
+    assert request_headers['If-None-Match'] == '"abc"'
+    assert request_headers['If-Modified-Since'] == (
+        'Mon, 12 Jul 2021 10:05:00 GMT'
+    )
+
+
+def test_pooled_session_maker_returns_shared_session():
+    # given
+    session_maker = PooledSessionMaker()
+    # when
+    first_session = session_maker()
+    second_session = session_maker()
+    # then
+    assert first_session is second_session
+
+
+def test_pooled_session_maker_mounts_tuned_adapter():
+    # given
+    session_maker = PooledSessionMaker(
+        pool_maxsize=20,
+        pool_block=True,
+        max_retries=3,
+    )
+    # when
+    session = session_maker()
+    # then
+    adapter = session.get_adapter('https://swapi/')
+    assert isinstance(adapter, KeepAliveHTTPAdapter)
+    assert adapter.poolmanager.connection_pool_kw['maxsize'] == 20
+    assert adapter.poolmanager.connection_pool_kw['block'] is True
+    assert adapter.max_retries.total == 3
+
+
+def test_close_keeps_session_open_when_keep_session():
+    # given
+    session_mock = Mock(spec_set=requests.Session())
+    client = StarWarsClient(
+        session_maker=lambda: session_mock,
+        keep_session=True,
+    )
+    # when
+    with client:
+        pass
+    with client:
+        pass
+    # then
+    session_mock.close.assert_not_called()
+
+
+def test_client_nested_context_keeps_session_open():
+    # given
+    session_mock = Mock(spec_set=requests.Session())
+    client = StarWarsClient(session_maker=lambda: session_mock)
+    # when
+    with client:
+        with client:
+            pass
+        session = client.session
+    # then
+    assert session is session_mock
+    session_mock.close.assert_called_once()
+
+
+def test_get_passes_default_timeout():
+    # given
+    session_mock = Mock(spec_set=requests.Session())
+    client = StarWarsClient(session_maker=lambda: session_mock, timeout=(1, 2))
+    # when
+    with client:
+        client.get(TEST_URL)
+    # then
+    session_mock.get.assert_called_with(TEST_URL, timeout=(1, 2))
+
+
+@pytest.mark.parametrize(('value', 'expected_seconds'), [
+    (None, None),
+    ('', None),
+    ('120', 120.0),
+    ('-5', 0.0),
+    ('Mon, 12 Jul 2021 10:05:00 GMT', 0.0),
+    ('invalid', None),
+])
+def test_parse_retry_after(value, expected_seconds):
+    # when
+    seconds = parse_retry_after(value)
+    # then
+    assert seconds == expected_seconds
+
+
+@responses.activate
+def test_get_retries_throttled_request_with_rate_limiter():
+    # given
+    payload = {'test': True}
+    responses.add(
+        responses.GET, TEST_URL, status=429, headers={'Retry-After': '0'}
+    )
+    responses.add(responses.GET, TEST_URL, json=payload)
+    rate_limiter = RateLimiter(rate=100, max_retries=1, backoff_base=0.001)
+    # when
+    with StarWarsClient(rate_limiter=rate_limiter) as client:
+        result = client.get(TEST_URL)
+    # then
+    assert result == payload
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_get_raise_too_many_requests_when_retries_exhausted():
+    # given
+    responses.add(
+        responses.GET, TEST_URL, status=429, headers={'Retry-After': '0'}
+    )
+    rate_limiter = RateLimiter(rate=100, max_retries=2, backoff_base=0.001)
+    # then
+    with pytest.raises(TooManyRequests):
+        # when
+        with StarWarsClient(rate_limiter=rate_limiter) as client:
+            client.get(TEST_URL)
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_get_does_not_count_failed_request_as_success():
+    # given
+    responses.add(
+        responses.GET, TEST_URL, body=requests.ConnectionError('refused')
+    )
+    rate_limiter = RateLimiter(rate=100, max_concurrency=8)
+    rate_limiter.concurrency = 1
+    # then
+    with pytest.raises(requests.ConnectionError):
+        # when
+        with StarWarsClient(rate_limiter=rate_limiter) as client:
+            client.get(TEST_URL)
+    assert rate_limiter.concurrency == 1
@@ -0,0 +1,297 @@
+import io
+import struct
+from types import SimpleNamespace
+
+import petl
+import pytest
+
+from starwars.columnar import (
+    MAGIC,
+    ColumnarFile,
+    ColumnarTable,
+    parse_number,
+    write_columns,
+)
+
+ROWS = [
+    ('name', 'height', 'homeworld'),
+    ('Luke Skywalker', '172', 'Tatooine'),
+    ('C-3PO', '167', 'Tatooine'),
+    ('Leia Organa', '150', 'Alderaan'),
+]
+
+TYPED_ROWS = [
+    ('name', 'mass', 'hair'),
+    ('Luke Skywalker', '77', 'blond'),
+    ('Jabba', '1,358', 'n/a'),
+    ('R2-D2', 'unknown', 'n/a'),
+    ('Leia Organa', '49', 'brown'),
+    ('Chewbacca', 'unknown', 'brown'),
+]
+
+
+@pytest.fixture
+def columns_buffer():
+    file = io.BytesIO()
+    write_columns(petl.wrap(ROWS), file)
+    return file.getvalue()
+
+
+def test_columnar_file_header(columns_buffer):
+    # when
+    columns = ColumnarFile(columns_buffer)
+    # then
+    assert columns.header == ROWS[0]
+    assert columns.rows == 3
+
+
+def test_columnar_file_dictionary_encodes_values(columns_buffer):
+    # when
+    columns = ColumnarFile(columns_buffer)
+    # then
+    assert columns.values('homeworld') == ['Tatooine', 'Alderaan']
+    assert list(columns.codes('homeworld')) == [0, 0, 1]
+
+
+def test_columnar_file_rejects_other_files():
+    # then
+    with pytest.raises(ValueError):
+        # when
+        ColumnarFile(b'name,height\r\n')
+
+
+def test_columnar_file_rejects_other_versions():
+    # given
+    metadata = b'{"version": 0, "rows": 0, "columns": []}'
+    buffer = MAGIC + struct.pack('<Q', len(metadata)) + metadata
+    # then
+    with pytest.raises(ValueError, match='unsupported columnar file version'):
+        # when
+        ColumnarFile(buffer)
+
+
+def test_columnar_table_returns_rows(columns_buffer):
+    # given
+    table = ColumnarTable(ColumnarFile(columns_buffer))
+    # when
+    rows = list(table)
+    # then
+    assert rows == ROWS
+
+
+def test_columnar_table_reads_rows_at_indices(columns_buffer):
+    # given
+    table = ColumnarTable(ColumnarFile(columns_buffer), fields=['name'])
+    # when
+    rows = list(table.rows([2, 0]))
+    # then
+    assert rows == [('Leia Organa',), ('Luke Skywalker',)]
+
+
+def test_columnar_table_returns_selected_fields(columns_buffer):
+    # given
+    table = ColumnarTable(ColumnarFile(columns_buffer), fields=['homeworld'])
+    # when
+    rows = list(table)
+    # then
+    assert rows == [('homeworld',), ('Tatooine',), ('Tatooine',), ('Alderaan',)]
+
+
+def test_columnar_table_empty():
+    # given
+    file = io.BytesIO()
+    write_columns(petl.wrap([ROWS[0]]), file)
+    table = ColumnarTable(ColumnarFile(file.getvalue()))
+    # when
+    rows = list(table)
+    # then
+    assert rows == [ROWS[0]]
+
+
+def test_columnar_file_open_memory_maps_file(columns_buffer, tmp_path):
+    # given
+    path = tmp_path.joinpath('dataset.swcol')
+    path.write_bytes(columns_buffer)
+    # when
+    columns = ColumnarFile.open(SimpleNamespace(path=str(path)))
+    # then
+    assert list(ColumnarTable(columns)) == ROWS
+
+
+def test_columnar_file_open_reads_file_without_path(columns_buffer):
+    # when
+    columns = ColumnarFile.open(io.BytesIO(columns_buffer))
+    # then
+    assert list(ColumnarTable(columns)) == ROWS
+
+
+def test_columnar_file_value_count_index(columns_buffer):
+    # when
+    columns = ColumnarFile(columns_buffer)
+    # then
+    assert list(columns.counts('homeworld')) == [2, 1]
+    assert list(columns.counts('name')) == [1, 1, 1]
+
+
+@pytest.mark.parametrize('fields', [
+    ['homeworld'],
+    ['name'],
+    ['homeworld', 'height'],
+    ['height', 'homeworld', 'name'],
+])
+def test_columnar_table_value_counts_equal_petl_value_counts(
+    columns_buffer,
+    fields
+):
+    # given
+    table = ColumnarTable(ColumnarFile(columns_buffer))
+    expected_rows = list(petl.cutout(
+        petl.valuecounts(petl.wrap(ROWS), *fields),
+        'frequency'
+    ))
+    # when
+    rows = list(table.value_counts(fields))
+    # then
+    assert rows == expected_rows
+
+
+def test_columnar_file_sort_order_index(columns_buffer):
+    # when
+    columns = ColumnarFile(columns_buffer)
+    # then
+    assert list(columns.order('name')) == [1, 2, 0]
+    assert list(columns.order('homeworld')) == [2, 0, 1]
+
+
+@pytest.mark.parametrize('field', ['name', 'height', 'homeworld'])
+@pytest.mark.parametrize('reverse', [False, True])
+def test_columnar_table_sort_equals_petl_sort(columns_buffer, field, reverse):
+    # given
+    table = ColumnarTable(ColumnarFile(columns_buffer))
+    expected_rows = list(petl.sort(petl.wrap(ROWS), field, reverse=reverse))
+    # when
+    rows = list(table.sort(field, reverse=reverse))
+    # then
+    assert rows == expected_rows
+
+
+@pytest.mark.parametrize('order_by, reverse, start, stop, expected_names', [
+    (None, False, 0, 2, ['Luke Skywalker', 'C-3PO']),
+    (None, False, 1, None, ['C-3PO', 'Leia Organa']),
+    ('homeworld', True, 0, 2, ['Luke Skywalker', 'C-3PO']),
+    ('homeworld', True, 1, 3, ['C-3PO', 'Leia Organa']),
+    ('name', False, 2, 5, ['Luke Skywalker']),
+])
+def test_columnar_table_slice(
+    columns_buffer,
+    order_by,
+    reverse,
+    start,
+    stop,
+    expected_names
+):
+    # given
+    table = ColumnarTable(ColumnarFile(columns_buffer), fields=['name'])
+    if order_by is not None:
+        table = table.sort(order_by, reverse=reverse)
+    # when
+    rows = list(table.slice(start, stop))
+    # then
+    assert rows == [('name',), *((name,) for name in expected_names)]
+
+
+def test_columnar_table_slice_of_slice(columns_buffer):
+    # given
+    table = ColumnarTable(ColumnarFile(columns_buffer), fields=['name'])
+    # when
+    rows = list(table.slice(1).slice(0, 1))
+    # then
+    assert rows == [('name',), ('C-3PO',)]
+
+
+@pytest.mark.parametrize('value, expected_number', [
+    ('172', 172.0),
+    ('1,358', 1358.0),
+    ('-0.5', -0.5),
+    ('unknown', None),
+    ('n/a', None),
+    ('', None),
+    (None, None),
+])
+def test_parse_number(value, expected_number):
+    # when
+    number = parse_number(value)
+    # then
+    assert number == expected_number
+
+
+@pytest.mark.parametrize('value', ['19BBY', 'blond', '1,35', '1.'])
+def test_parse_number_rejects_other_values(value):
+    # when, then
+    with pytest.raises(ValueError):
+        parse_number(value)
+
+
+def test_write_columns_infers_schema():
+    # given
+    file = io.BytesIO()
+    # when
+    schema = write_columns(petl.wrap(TYPED_ROWS), file)
+    # then
+    assert schema == {'name': 'string', 'mass': 'number', 'hair': 'string'}
+    columns = ColumnarFile(file.getvalue())
+    assert columns.schema == schema
+    assert columns.numbers('name') is None
+    assert list(columns.numbers('mass'))[:2] == [77.0, 1358.0]
+    assert columns.nulls('mass') == {2}
+
+
+def test_write_columns_rejects_table_without_header():
+    # then
+    with pytest.raises(ValueError, match='without a header'):
+        # when
+        write_columns(petl.wrap([]), io.BytesIO())
+
+
+@pytest.mark.parametrize('reverse, expected_names', [
+    (False, ['Leia Organa', 'Luke Skywalker', 'Jabba', 'R2-D2', 'Chewbacca']),
+    (True, ['Jabba', 'Luke Skywalker', 'Leia Organa', 'R2-D2', 'Chewbacca']),
+])
+def test_columnar_table_sorts_numbers_with_nulls_last(reverse, expected_names):
+    # given
+    file = io.BytesIO()
+    write_columns(petl.wrap(TYPED_ROWS), file)
+    table = ColumnarTable(ColumnarFile(file.getvalue()), fields=['name'])
+    # when
+    rows = list(table.sort('mass', reverse=reverse))
+    # then
+    assert [name for (name,) in rows[1:]] == expected_names
+
+
+@pytest.mark.parametrize('order_by, reverse, expected_rows', [
+    ('mass', False, [('49', 1), ('77', 1), ('1,358', 1), ('unknown', 2)]),
+    ('mass', True, [('1,358', 1), ('77', 1), ('49', 1), ('unknown', 2)]),
+    ('count', True, [('unknown', 2), ('77', 1), ('1,358', 1), ('49', 1)]),
+])
+def test_value_counts_table_sort(order_by, reverse, expected_rows):
+    # given
+    file = io.BytesIO()
+    write_columns(petl.wrap(TYPED_ROWS), file)
+    table = ColumnarTable(ColumnarFile(file.getvalue())).value_counts(['mass'])
+    # when
+    rows = list(table.sort(order_by, reverse=reverse))
+    # then
+    assert rows == [('mass', 'count'), *expected_rows]
+
+
+def test_columnar_table_value_counts_decodes_aggregated_columns_only(
+    columns_buffer
+):
+    # given
+    columns = ColumnarFile(columns_buffer)
+    table = ColumnarTable(columns)
+    # when
+    rows = list(table.value_counts(['homeworld']))
+    # then
+    assert rows == [('homeworld', 'count'), ('Tatooine', 2), ('Alderaan', 1)]
+    assert list(columns._values) == ['homeworld']
@@ -0,0 +1,112 @@
+import pytest
+
+from starwars.metrics import Registry, Timings
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_registry_renders_counter():
+    # given
+    registry = Registry()
+    counter = registry.counter(
+        'lookups_total',
+        'Lookups.',
+        labelnames=('result',),
+    )
+    counter.inc(result='hit')
+    counter.inc(2, result='hit')
+    counter.inc(result='miss')
+    # when
+    text = registry.render()
+    # then
+    assert text == (
+        '# HELP lookups_total Lookups.\n'
+        '# TYPE lookups_total counter\n'
+        'lookups_total{result="hit"} 3\n'
+        'lookups_total{result="miss"} 1\n'
+    )
+
+
+def test_registry_renders_histogram():
+    # given
+    registry = Registry()
+    histogram = registry.histogram(
+        'stage_seconds',
+        'Stages.',
+        labelnames=('stage',),
+        buckets=(0.1, 1),
+    )
+    histogram.observe(0.05, stage='fetch')
+    histogram.observe(0.5, stage='fetch')
+    histogram.observe(2, stage='fetch')
+    # when
+    text = registry.render()
+    # then
+    assert text == (
+        '# HELP stage_seconds Stages.\n'
+        '# TYPE stage_seconds histogram\n'
+        'stage_seconds_bucket{stage="fetch",le="0.1"} 1\n'
+        'stage_seconds_bucket{stage="fetch",le="1"} 2\n'
+        'stage_seconds_bucket{stage="fetch",le="+Inf"} 3\n'
+        'stage_seconds_count{stage="fetch"} 3\n'
+        'stage_seconds_sum{stage="fetch"} 2.55\n'
+    )
+
+
+def test_histogram_set_aggregated_observations():
+    # given
+    registry = Registry()
+    histogram = registry.histogram('duration_seconds', 'Jobs.', buckets=(1,))
+    # when
+    histogram.set([1, 3], 4.5)
+    # then
+    assert registry.render() == (
+        '# HELP duration_seconds Jobs.\n'
+        '# TYPE duration_seconds histogram\n'
+        'duration_seconds_bucket{le="1"} 1\n'
+        'duration_seconds_bucket{le="+Inf"} 3\n'
+        'duration_seconds_count 3\n'
+        'duration_seconds_sum 4.5\n'
+    )
+
+
+def test_counter_requires_all_labels():
+    # given
+    counter = Registry().counter('lookups_total', 'Lookups.', ('result',))
+    # when
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_registry_rejects_duplicate_metric():
+    # given
+    registry = Registry()
+    registry.counter('lookups_total', 'Lookups.')
+    # when
+    with pytest.raises(ValueError):
+        registry.histogram('lookups_total', 'Lookups.')
+
+
+def test_timings_add_time_of_stages():
+    # given
+    clock = FakeClock()
+    timings = Timings(clock=clock)
+    # when
+    for _ in range(2):
+        with timings.time('fetch'):
+            clock.now += 1.5
+    timings.add('store', 0.5)
+    timings.count('pages', 2)
+    # then
+    assert timings.seconds('fetch') == 3.0
+    assert timings.seconds('fetch', 'store', 'transform') == 3.5
+    assert timings.as_dict() == {
+        'seconds': {'fetch': 3.0, 'store': 0.5},
+        'counts': {'pages': 2},
+    }
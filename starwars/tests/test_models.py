@@ -2,7 +2,7 @@ from uuid import uuid4
 
 import pytest
 
-from starwars.models import dataset_destination
+from starwars.models import blob_destination, dataset_destination
 from . import factories
 
 
@@ -30,3 +30,12 @@ def test_dataset_destination_without_filename():
     upload_to = dataset_destination(instance=dataset_mock)
     # then
     assert upload_to == f'datasets/%Y/%m/%d/{dataset_uuid!s}.csv'
+
+
+def test_blob_destination():
+    # given
+    checksum = 'ab' + '0' * 62
+    # when
+    path = blob_destination(checksum, '.swcol')
+    # then
+    assert path == f'blobs/ab/{checksum}.swcol'
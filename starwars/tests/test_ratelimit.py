@@ -0,0 +1,120 @@
+from unittest.mock import patch
+
+import pytest
+
+from starwars.ratelimit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def create_rate_limiter(clock, **kwargs):
+    return RateLimiter(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_acquire_does_not_wait_within_burst(clock):
+    # given
+    rate_limiter = create_rate_limiter(clock, rate=2, burst=2)
+    # when
+    for _ in range(2):
+        rate_limiter.acquire()
+        rate_limiter.release()
+    # then
+    assert clock.sleeps == []
+
+
+def test_acquire_waits_for_token(clock):
+    # given
+    rate_limiter = create_rate_limiter(clock, rate=2, burst=1)
+    rate_limiter.acquire()
+    rate_limiter.release()
+    # when
+    rate_limiter.acquire()
+    # then
+    assert clock.now == pytest.approx(0.5)
+
+
+def test_release_throttled_halves_concurrency(clock):
+    # given
+    rate_limiter = create_rate_limiter(clock, rate=10, max_concurrency=8)
+    rate_limiter.acquire()
+    # when
+    rate_limiter.release(throttled=True, retry_after=0)
+    # then
+    assert rate_limiter.concurrency == 4
+
+
+def test_release_increases_concurrency_after_successes(clock):
+    # given
+    rate_limiter = create_rate_limiter(clock, rate=100, max_concurrency=8)
+    rate_limiter.concurrency = 2
+    # when
+    for _ in range(2):
+        rate_limiter.acquire()
+        rate_limiter.release()
+    # then
+    assert rate_limiter.concurrency == 3
+
+
+def test_release_failed_keeps_concurrency(clock):
+    # given
+    rate_limiter = create_rate_limiter(clock, rate=100, max_concurrency=8)
+    rate_limiter.concurrency = 2
+    # when
+    for _ in range(4):
+        rate_limiter.acquire()
+        rate_limiter.release(failed=True)
+    # then
+    assert rate_limiter.concurrency == 2
+    assert clock.sleeps == []
+
+
+def test_acquire_waits_for_retry_after(clock):
+    # given
+    rate_limiter = create_rate_limiter(clock, rate=10)
+    rate_limiter.acquire()
+    rate_limiter.release(throttled=True, retry_after=3)
+    # when
+    rate_limiter.acquire()
+    # then
+    assert clock.now >= 3
+
+
+@pytest.mark.parametrize(('attempt', 'ceiling'), [
+    (1, 0.5),
+    (2, 1.0),
+    (3, 2.0),
+    (10, 60.0),
+])
+def test_backoff_is_jittered_exponentially(attempt, ceiling, clock):
+    # given
+    rate_limiter = create_rate_limiter(clock, rate=10)
+    # when
+    with patch('random.uniform', side_effect=lambda a, b: b):
+        delay = rate_limiter.backoff(attempt, retry_after=None)
+    # then
+    assert delay == ceiling
+
+
+def test_backoff_honours_retry_after(clock):
+    # given
+    rate_limiter = create_rate_limiter(clock, rate=10)
+    # when
+    delay = rate_limiter.backoff(1, retry_after=30)
+    # then
+    assert delay == 30
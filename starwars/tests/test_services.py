@@ -0,0 +1,749 @@
+import contextlib
+import gzip
+import hashlib
+import io
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+import petl
+import pytest
+import responses
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+from starwars.client import StarWarsClient
+from starwars.columnar import ColumnarFile, ColumnarTable, write_columns
+from starwars.models import Dataset
+from starwars.transforms import (
+    PLANET_CACHE_ALIAS,
+    transform_loaded_people_table,
+)
+from starwars.services import (
+    DATASET_CACHE_ALIAS,
+    claim_fetch_job,
+    collect_metrics,
+    fail_stale_fetch_jobs,
+    fetch_table_csv,
+    get_previous_dataset,
+    get_transformed_rows,
+    iter_csv_lines,
+    iter_ndjson_lines,
+    load_dataset_table,
+    load_previous_rows,
+    run_fetch_job,
+    save_blob,
+    save_dataset_file,
+    submit_fetch_job,
+    transformed_rows_cache_key,
+)
+
+pytestmark = pytest.mark.django_db
+
+CSV_TABLE = b'name,height\r\nLuke Skywalker,172\r\n'
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+@pytest.fixture
+def client_mock():
+    return Mock(spec_set=StarWarsClient)
+
+
+def test_submit_fetch_job_creates_pending_dataset():
+    # when
+    dataset = submit_fetch_job()
+    # then
+    assert dataset.status == Dataset.Status.PENDING
+
+
+def test_claim_fetch_job_claims_oldest_pending_dataset():
+    # given
+    first_dataset = submit_fetch_job()
+    submit_fetch_job()
+    # when
+    dataset = claim_fetch_job()
+    # then
+    assert dataset == first_dataset
+    dataset.refresh_from_db()
+    assert dataset.status == Dataset.Status.RUNNING
+    assert dataset.heartbeat is not None
+
+
+def test_claim_fetch_job_without_pending_datasets():
+    # given
+    Dataset.objects.create(
+        status=Dataset.Status.RUNNING,
+        heartbeat=timezone.now(),
+    )
+    # when
+    dataset = claim_fetch_job()
+    # then
+    assert dataset is None
+
+
+def test_fail_stale_fetch_jobs(settings):
+    # given
+    settings.DATASET_JOB_TIMEOUT = 60
+    now = timezone.now()
+    stale_dataset = Dataset.objects.create(
+        status=Dataset.Status.RUNNING,
+        heartbeat=now - timedelta(seconds=120),
+    )
+    running_dataset = Dataset.objects.create(
+        status=Dataset.Status.RUNNING,
+        heartbeat=now,
+    )
+    pending_dataset = submit_fetch_job()
+    # when
+    failed = fail_stale_fetch_jobs()
+    # then
+    assert failed == 1
+    stale_dataset.refresh_from_db()
+    assert stale_dataset.status == Dataset.Status.FAILED
+    assert stale_dataset.error
+    running_dataset.refresh_from_db()
+    assert running_dataset.status == Dataset.Status.RUNNING
+    pending_dataset.refresh_from_db()
+    assert pending_dataset.status == Dataset.Status.PENDING
+
+
+@patch('starwars.services.fetch_table_csv')
+def test_run_fetch_job_saves_dataset(fetch_table_csv_mock, client_mock):
+    # given
+    @contextlib.contextmanager
+    def fetch_table_csv(client, progress, **kwargs):
+        progress(1, 2)
+        progress(2, 2)
+        yield File(io.BytesIO(CSV_TABLE))
+
+    fetch_table_csv_mock.side_effect = fetch_table_csv
+    submit_fetch_job()
+    dataset = claim_fetch_job()
+    # when
+    run_fetch_job(dataset, client_mock)
+    # then
+    dataset.refresh_from_db()
+    assert dataset.status == Dataset.Status.DONE
+    assert dataset.file.read() == CSV_TABLE
+    assert (dataset.pages_done, dataset.pages_total) == (2, 2)
+    assert dataset.progress == 100
+    assert dataset.heartbeat is not None
+    assert dataset.duration is not None
+
+
+@patch('starwars.services.fetch_table_csv')
+def test_run_fetch_job_records_timings(fetch_table_csv_mock, client_mock):
+    # given
+    @contextlib.contextmanager
+    def fetch_table_csv(client, progress, timings, **kwargs):
+        timings.add('fetch', 1.5)
+        timings.count('pages', 2)
+        yield File(io.BytesIO(CSV_TABLE))
+
+    fetch_table_csv_mock.side_effect = fetch_table_csv
+    submit_fetch_job()
+    dataset = claim_fetch_job()
+    # when
+    run_fetch_job(dataset, client_mock)
+    # then
+    dataset.refresh_from_db()
+    assert dataset.timings['seconds']['fetch'] == 1.5
+    assert dataset.timings['seconds']['store'] > 0
+    assert dataset.timings['counts'] == {'pages': 2}
+
+
+@patch('starwars.services.fetch_table_csv')
+def test_run_fetch_job_marks_dataset_failed(fetch_table_csv_mock, client_mock):
+    # given
+    fetch_table_csv_mock.side_effect = ValueError('invalid page')
+    submit_fetch_job()
+    dataset = claim_fetch_job()
+    # when
+    run_fetch_job(dataset, client_mock)
+    # then
+    dataset.refresh_from_db()
+    assert dataset.status == Dataset.Status.FAILED
+    assert dataset.error == 'invalid page'
+    assert not dataset.file
+
+
+@patch('starwars.services.write_columns')
+@patch('starwars.services.fetch_table_csv')
+def test_run_fetch_job_sends_heartbeat_while_storing(
+    fetch_table_csv_mock,
+    write_columns_mock,
+    client_mock,
+    settings,
+):
+    # given
+    settings.DATASET_JOB_TIMEOUT = 60
+    submit_fetch_job()
+    dataset = claim_fetch_job()
+
+    @contextlib.contextmanager
+    def fetch_table_csv(client, **kwargs):
+        Dataset.objects.filter(pk=dataset.pk).update(
+            heartbeat=timezone.now() - timedelta(seconds=120),
+        )
+        yield File(io.BytesIO(CSV_TABLE))
+
+    def write_columns_and_fail_stale_jobs(table, file):
+        fail_stale_fetch_jobs()
+        return write_columns(table, file)
+
+    fetch_table_csv_mock.side_effect = fetch_table_csv
+    write_columns_mock.side_effect = write_columns_and_fail_stale_jobs
+    # when
+    run_fetch_job(dataset, client_mock)
+    # then
+    dataset.refresh_from_db()
+    assert dataset.status == Dataset.Status.DONE
+
+
+@patch('starwars.services.fetch_table_csv')
+def test_run_fetch_job_does_not_resurrect_failed_job(
+    fetch_table_csv_mock,
+    client_mock,
+):
+    # given
+    submit_fetch_job()
+    dataset = claim_fetch_job()
+
+    @contextlib.contextmanager
+    def fetch_table_csv(client, **kwargs):
+        Dataset.objects.filter(pk=dataset.pk).update(
+            status=Dataset.Status.FAILED,
+            error='stale',
+        )
+        yield File(io.BytesIO(CSV_TABLE))
+
+    fetch_table_csv_mock.side_effect = fetch_table_csv
+    # when
+    result = run_fetch_job(dataset, client_mock)
+    # then
+    assert result.status == Dataset.Status.FAILED
+    dataset.refresh_from_db()
+    assert dataset.status == Dataset.Status.FAILED
+    assert dataset.error == 'stale'
+    assert not dataset.file
+
+
+@patch('starwars.services.transform_extracted_people_table')
+@patch('starwars.services.PeopleTable')
+def test_fetch_table_csv_writes_temporary_file(
+    people_table_mock,
+    transform_extracted_people_table_mock,
+    client_mock
+):
+    # given
+    transform_extracted_people_table_mock.return_value = [
+        ('name', 'height'),
+        ('Luke Skywalker', '172'),
+    ]
+    # when
+    with fetch_table_csv(client_mock) as csv_file:
+        content = csv_file.read()
+    # then
+    assert content == CSV_TABLE
+    assert csv_file.closed
+
+
+@responses.activate
+@pytest.mark.parametrize('records', [None, []])
+def test_fetch_table_csv_resolves_homeworlds_of_last_batch(settings, records):
+    # given
+    settings.DATASET_FETCH_URL = 'http://swapi/api/people/'
+    responses.add(
+        responses.GET,
+        'http://swapi/api/people/',
+        json={
+            'count': 2,
+            'next': 'http://swapi/api/people/?page=2',
+            'results': [
+                {
+                    'name': 'Luke',
+                    'homeworld': 'http://swapi/api/planets/1/',
+                    'edited': '2014-12-20T21:17:56.891000Z',
+                    'url': 'http://swapi/api/people/1/',
+                },
+            ],
+        },
+        match_querystring=True,
+    )
+    responses.add(
+        responses.GET,
+        'http://swapi/api/people/?page=2',
+        json={
+            'count': 2,
+            'next': None,
+            'results': [
+                {
+                    'name': 'Leia',
+                    'homeworld': 'http://swapi/api/planets/2/',
+                    'edited': '2014-12-20T21:17:56.891000Z',
+                    'url': 'http://swapi/api/people/2/',
+                },
+            ],
+        },
+        match_querystring=True,
+    )
+    for planet_id, name in ((1, 'Tatooine'), (2, 'Alderaan')):
+        responses.add(
+            responses.GET,
+            f'http://swapi/api/planets/{planet_id}/',
+            json={'name': name},
+        )
+    caches[PLANET_CACHE_ALIAS].clear()
+    # when
+    with fetch_table_csv(StarWarsClient(), records=records) as csv_file:
+        content = csv_file.read()
+    # then
+    assert content == (
+        b'name,homeworld,date\r\n'
+        b'Luke,Tatooine,2014-12-20\r\n'
+        b'Leia,Alderaan,2014-12-20\r\n'
+    )
+
+
+def test_save_dataset_file_writes_columnar_file():
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.RUNNING)
+    # when
+    save_dataset_file(dataset, File(io.BytesIO(CSV_TABLE)))
+    dataset.save()
+    # then
+    assert dataset.columns
+    table = load_dataset_table(dataset)
+    assert isinstance(table, ColumnarTable)
+    assert list(table) == [('name', 'height'), ('Luke Skywalker', '172')]
+    assert dataset.schema == {'name': 'string', 'height': 'number'}
+
+
+def test_load_dataset_table_without_columnar_file():
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.DONE)
+    dataset.file.save('dataset.csv', File(io.BytesIO(CSV_TABLE)))
+    # when
+    table = load_dataset_table(dataset)
+    # then
+    assert list(table) == [('name', 'height'), ('Luke Skywalker', '172')]
+
+
+def test_get_transformed_rows():
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.DONE)
+    table = petl.wrap([
+        ('name', 'homeworld'),
+        ('Luke Skywalker', 'Tatooine'),
+        ('Leia Organa', 'Alderaan'),
+        ('C-3PO', 'Tatooine'),
+    ])
+    # when
+    header, rows = get_transformed_rows(
+        dataset,
+        table,
+        aggregate_by=['homeworld'],
+        order_by='homeworld',
+    )
+    # then
+    assert header == ('homeworld', 'count')
+    assert rows == [('Alderaan', 1), ('Tatooine', 2)]
+
+
+@patch(
+    'starwars.services.transform_loaded_people_table',
+    wraps=transform_loaded_people_table
+)
+def test_get_transformed_rows_is_cached(transform_loaded_people_table_mock):
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.DONE)
+    table = petl.wrap([('name',), ('Luke Skywalker',), ('C-3PO',)])
+    get_transformed_rows(
+        dataset,
+        table,
+        aggregate_by=['name'],
+        order_by='-name',
+    )
+    # when
+    header, rows = get_transformed_rows(
+        dataset,
+        table,
+        aggregate_by=['name', 'unknown'],
+        order_by='-name',
+    )
+    # then
+    assert rows == [('Luke Skywalker', 1), ('C-3PO', 1)]
+    transform_loaded_people_table_mock.assert_called_once()
+
+
+@patch(
+    'starwars.services.transform_loaded_people_table',
+    wraps=transform_loaded_people_table
+)
+def test_get_transformed_rows_selects_page_of_csv_rows(
+    transform_loaded_people_table_mock,
+):
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.DONE)
+    table = petl.wrap([
+        ('name', 'homeworld'),
+        ('Luke Skywalker', 'Tatooine'),
+        ('Leia Organa', 'Alderaan'),
+        ('C-3PO', 'Tatooine'),
+    ])
+    # when
+    header, rows = get_transformed_rows(
+        dataset,
+        table,
+        order_by='name',
+        limit=1,
+        offset=1,
+    )
+    # then
+    assert header == ('name', 'homeworld')
+    assert rows == [('Leia Organa', 'Alderaan')]
+    transform_loaded_people_table_mock.assert_called_once_with(
+        table,
+        order_by='name',
+        limit=1,
+        offset=1,
+    )
+
+
+def test_get_transformed_rows_reads_sorted_columnar_rows():
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.DONE)
+    file = io.BytesIO()
+    write_columns(petl.wrap([
+        ('name', 'homeworld'),
+        ('Luke Skywalker', 'Tatooine'),
+        ('Leia Organa', 'Alderaan'),
+        ('C-3PO', 'Tatooine'),
+    ]), file)
+    table = ColumnarTable(ColumnarFile(file.getvalue()))
+    # when
+    header, rows = get_transformed_rows(
+        dataset,
+        table,
+        order_by='-homeworld',
+        limit=2,
+    )
+    # then
+    assert header == ('name', 'homeworld')
+    assert rows == [('Luke Skywalker', 'Tatooine'), ('C-3PO', 'Tatooine')]
+
+
+@patch(
+    'starwars.services.transform_loaded_people_table',
+    wraps=transform_loaded_people_table
+)
+def test_get_transformed_rows_does_not_cache_too_many_rows(
+    transform_loaded_people_table_mock,
+    settings,
+):
+    # given
+    settings.DATASET_CACHE_MAX_ROWS = 1
+    dataset = Dataset.objects.create(status=Dataset.Status.DONE)
+    table = petl.wrap([('name',), ('Luke Skywalker',), ('C-3PO',)])
+    get_transformed_rows(dataset, table, aggregate_by=['name'])
+    # when
+    header, rows = get_transformed_rows(dataset, table, aggregate_by=['name'])
+    # then
+    assert rows == [('Luke Skywalker', 1), ('C-3PO', 1)]
+    assert transform_loaded_people_table_mock.call_count == 2
+
+
+@patch(
+    'starwars.services.transform_loaded_people_table',
+    wraps=transform_loaded_people_table
+)
+def test_get_transformed_rows_reads_cached_chunks_of_page(
+    transform_loaded_people_table_mock,
+    monkeypatch,
+):
+    # given
+    monkeypatch.setattr('starwars.services.CACHED_ROWS_CHUNK_SIZE', 1)
+    dataset = Dataset.objects.create(status=Dataset.Status.DONE)
+    table = petl.wrap([
+        ('name', 'homeworld'),
+        ('Luke Skywalker', 'Tatooine'),
+        ('Leia Organa', 'Alderaan'),
+        ('R2-D2', 'Naboo'),
+    ])
+    get_transformed_rows(dataset, table, aggregate_by=['homeworld'])
+    key = transformed_rows_cache_key(dataset, ('homeworld',), None)
+    caches[DATASET_CACHE_ALIAS].delete(f'{key}:0')
+    # when
+    header, rows = get_transformed_rows(
+        dataset,
+        table,
+        aggregate_by=['homeworld'],
+        limit=5,
+        offset=1,
+    )
+    # then
+    assert header == ('homeworld', 'count')
+    assert rows == [('Alderaan', 1), ('Naboo', 1)]
+    transform_loaded_people_table_mock.assert_called_once()
+
+
+@pytest.mark.parametrize('aggregate_by, expected_rows', [
+    (None, [('C-3PO', 'Tatooine')]),
+    (['homeworld'], [('Alderaan', 1)]),
+])
+def test_get_transformed_rows_returns_page(aggregate_by, expected_rows):
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.DONE)
+    file = io.BytesIO()
+    write_columns(petl.wrap([
+        ('name', 'homeworld'),
+        ('Luke Skywalker', 'Tatooine'),
+        ('Leia Organa', 'Alderaan'),
+        ('C-3PO', 'Tatooine'),
+    ]), file)
+    table = ColumnarTable(ColumnarFile(file.getvalue()))
+    # when
+    header, rows = get_transformed_rows(
+        dataset,
+        table,
+        aggregate_by=aggregate_by,
+        order_by='-homeworld',
+        limit=1,
+        offset=1,
+    )
+    # then
+    assert rows == expected_rows
+
+
+def test_iter_csv_lines():
+    # given
+    table = petl.wrap([('name', 'count'), ('Luke, Skywalker', 1)])
+    # when
+    lines = list(iter_csv_lines(table))
+    # then
+    assert lines == ['name,count\r\n', '"Luke, Skywalker",1\r\n']
+
+
+def test_iter_ndjson_lines():
+    # given
+    table = petl.wrap([('name', 'count'), ('Luke Skywalker', 1)])
+    # when
+    lines = list(iter_ndjson_lines(table))
+    # then
+    assert lines == ['{"name": "Luke Skywalker", "count": 1}\n']
+
+
+def test_iter_ndjson_lines_empty_table():
+    # when
+    lines = list(iter_ndjson_lines(petl.wrap([])))
+    # then
+    assert lines == []
+
+
+def test_get_previous_dataset_requires_records():
+    # given
+    Dataset.objects.create(status=Dataset.Status.DONE, records=[['1', '2']])
+    Dataset.objects.create(status=Dataset.Status.DONE)
+    # when
+    dataset = get_previous_dataset()
+    # then
+    assert dataset is None
+
+
+def test_load_previous_rows():
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.RUNNING)
+    save_dataset_file(dataset, File(io.BytesIO(CSV_TABLE)))
+    dataset.records = [['people/1/', '2014-12-20']]
+    # when
+    previous_table, previous_rows = load_previous_rows(dataset)
+    # then
+    assert previous_rows == {'people/1/': ('2014-12-20', 0)}
+    assert list(previous_table.rows([0])) == [('Luke Skywalker', '172')]
+
+
+def test_load_previous_rows_without_columnar_file():
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.DONE)
+    dataset.file.save('dataset.csv', File(io.BytesIO(CSV_TABLE)))
+    dataset.records = [['people/1/', '2014-12-20']]
+    # when
+    previous_table, previous_rows = load_previous_rows(dataset)
+    # then
+    assert previous_table is None
+    assert previous_rows == {}
+
+
+@patch('starwars.services.transform_extracted_people_table')
+@patch('starwars.services.PeopleTable')
+def test_fetch_table_csv_reuses_previous_rows(
+    people_table_mock,
+    transform_extracted_people_table_mock,
+    client_mock
+):
+    # given
+    previous = Dataset.objects.create(status=Dataset.Status.RUNNING)
+    save_dataset_file(previous, File(io.BytesIO(CSV_TABLE)))
+    previous.records = [['people/1/', '2014-12-20']]
+    people_table_mock.return_value = petl.wrap([
+        ('name', 'height', 'url', 'edited'),
+        ('Luke', '172', 'people/1/', '2014-12-20'),
+    ])
+    transform_extracted_people_table_mock.side_effect = (
+        lambda table, client, **kwargs: petl.cutout(table, 'url', 'edited')
+    )
+    records = []
+    # when
+    with fetch_table_csv(
+        client_mock,
+        previous=previous,
+        records=records,
+    ) as csv_file:
+        content = csv_file.read()
+    # then
+    assert content == CSV_TABLE
+    assert records == [('people/1/', '2014-12-20')]
+
+
+def test_save_dataset_file_shares_identical_files(tmp_path):
+    # given
+    first = Dataset.objects.create(status=Dataset.Status.RUNNING)
+    second = Dataset.objects.create(status=Dataset.Status.RUNNING)
+    save_dataset_file(first, File(io.BytesIO(CSV_TABLE)))
+    # when
+    with patch('starwars.services.write_columns') as write_columns_mock:
+        save_dataset_file(second, File(io.BytesIO(CSV_TABLE)))
+    # then
+    write_columns_mock.assert_not_called()
+    assert second.checksum == first.checksum
+    assert second.file.name == first.file.name
+    assert second.columns.name == first.columns.name
+    assert second.schema == first.schema
+    assert len(list(tmp_path.glob('blobs/*/*'))) == 2
+
+
+def test_save_blob_deletes_duplicate_of_concurrent_save(tmp_path):
+    # given
+    storage = FileSystemStorage(location=tmp_path)
+    name = 'blobs/ab/abc.csv'
+    storage.save(name, File(io.BytesIO(CSV_TABLE)))
+    # when
+    saved_name = save_blob(storage, name, File(io.BytesIO(CSV_TABLE)))
+    # then
+    assert saved_name == name
+    assert [path.name for path in tmp_path.glob('blobs/*/*')] == ['abc.csv']
+
+
+def test_transformed_rows_are_shared_by_identical_datasets():
+    # given
+    first = Dataset.objects.create(status=Dataset.Status.DONE, checksum='ab')
+    second = Dataset.objects.create(status=Dataset.Status.DONE, checksum='ab')
+    # when
+    first_key = transformed_rows_cache_key(first, ('name',), None)
+    second_key = transformed_rows_cache_key(second, ('name',), None)
+    # then
+    assert first_key == second_key
+
+
+def test_save_dataset_file_compresses_file(settings):
+    # given
+    settings.DATASET_COMPRESSION = 'gzip'
+    dataset = Dataset.objects.create(status=Dataset.Status.RUNNING)
+    # when
+    save_dataset_file(dataset, File(io.BytesIO(CSV_TABLE)))
+    # then
+    assert dataset.file.name.endswith('.csv.gz')
+    with dataset.file.open('rb') as file:
+        assert gzip.decompress(file.read()) == CSV_TABLE
+    assert dataset.checksum == hashlib.sha256(CSV_TABLE).hexdigest()
+    assert list(load_dataset_table(dataset)) == [
+        ('name', 'height'),
+        ('Luke Skywalker', '172'),
+    ]
+
+
+def test_save_dataset_file_rejects_unsupported_compression(settings):
+    # given
+    settings.DATASET_COMPRESSION = 'zstd'
+    dataset = Dataset(status=Dataset.Status.RUNNING)
+    # then
+    with pytest.raises(ImproperlyConfigured, match="'gzip'"):
+        # when
+        save_dataset_file(dataset, File(io.BytesIO(CSV_TABLE)))
+    assert not dataset.file
+
+
+def test_load_dataset_table_decompresses_file():
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.DONE)
+    dataset.file.save('dataset.csv.gz', File(io.BytesIO(
+        gzip.compress(CSV_TABLE)
+    )))
+    # when
+    table = load_dataset_table(dataset)
+    # then
+    assert list(table) == [('name', 'height'), ('Luke Skywalker', '172')]
+
+
+def test_collect_metrics_from_dataset_timings(django_assert_num_queries):
+    # given
+    jobs = ((Dataset.Status.DONE, 3, 0.5), (Dataset.Status.FAILED, 0, 20))
+    for status, misses, seconds in jobs:
+        Dataset.objects.create(
+            status=status,
+            duration=timedelta(seconds=seconds),
+            timings={
+                'seconds': {'fetch': 0.2, 'planets': 0.7},
+                'counts': {
+                    'pages': 2,
+                    'planet_cache_hits': 1,
+                    'planet_cache_misses': misses,
+                },
+            },
+        )
+    Dataset.objects.create(status=Dataset.Status.RUNNING)
+    # when
+    with django_assert_num_queries(2):
+        text = collect_metrics().render()
+    # then
+    lines = text.splitlines()
+    assert 'starwars_fetch_jobs_total{status="done"} 1' in lines
+    assert 'starwars_fetch_jobs_total{status="failed"} 1' in lines
+    assert 'starwars_fetch_duration_seconds_bucket{le="0.5"} 1' in lines
+    assert 'starwars_fetch_duration_seconds_bucket{le="10"} 1' in lines
+    assert 'starwars_fetch_duration_seconds_bucket{le="30"} 2' in lines
+    assert 'starwars_fetch_duration_seconds_bucket{le="+Inf"} 2' in lines
+    assert 'starwars_fetch_duration_seconds_sum 20.5' in lines
+    assert 'starwars_fetch_stage_seconds_count{stage="planets"} 2' in lines
+    assert 'starwars_fetch_stage_seconds_sum{stage="fetch"} 0.4' in lines
+    assert 'starwars_people_pages_fetched_total 4' in lines
+    assert 'starwars_planet_lookups_total{result="hit"} 2' in lines
+    assert 'starwars_planet_lookups_total{result="miss"} 3' in lines
+    assert not any('stage="store"' in line for line in lines)
+    fetch_buckets = [
+        line for line in lines
+        if line.startswith('starwars_fetch_stage_seconds_bucket{stage="fetch"')
+    ]
+    assert fetch_buckets[:4] == [
+        'starwars_fetch_stage_seconds_bucket{stage="fetch",le="0.01"} 0',
+        'starwars_fetch_stage_seconds_bucket{stage="fetch",le="0.025"} 0',
+        'starwars_fetch_stage_seconds_bucket{stage="fetch",le="0.05"} 0',
+        'starwars_fetch_stage_seconds_bucket{stage="fetch",le="0.1"} 0',
+    ]
+    assert fetch_buckets[4] == (
+        'starwars_fetch_stage_seconds_bucket{stage="fetch",le="0.25"} 2'
+    )
+
+
+def test_base_settings_configure_caches():
+    # given
+    from web.settings import base
+    # then
+    assert {PLANET_CACHE_ALIAS, DATASET_CACHE_ALIAS} <= set(base.CACHES)
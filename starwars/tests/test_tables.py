@@ -1,3 +1,4 @@
+import io
 from unittest.mock import Mock, call, patch
 
 import petl
@@ -5,7 +6,13 @@ import pytest
 import requests
 
 from starwars.client import StarWarsClient
-from starwars.tables import PeopleTable
+from starwars.columnar import ColumnarFile, ColumnarTable, write_columns
+from starwars.metrics import Timings
+from starwars.tables import (
+    IncrementalTable,
+    PeopleTable,
+    remaining_page_urls,
+)
 
 TEST_URL = 'http://swapi/api/people/'
 
@@ -83,3 +90,186 @@ def test_people_table_queries_next_page(people_table, test_client):
             call(TEST_URL),
             call(next_page_url)
         ])
+
+
+def test_people_table_records_timings(test_client):
+    # given
+    timings = Timings()
+    people_table = PeopleTable(
+        client=test_client,
+        initial_url=TEST_URL,
+        timings=timings,
+    )
+    with patch.object(test_client, 'get') as get_mock:
+        get_mock.side_effect = [
+            create_people_page(next=f'{TEST_URL}?page=2'),
+            create_people_page(),
+        ]
+        # when
+        petl.nrows(people_table)
+    # then
+    assert timings.as_dict()['counts'] == {'pages': 2}
+    assert timings.seconds('fetch') > 0
+
+
+def test_remaining_page_urls():
+    # given
+    people_page = create_people_page(count=5, next=f'{TEST_URL}?page=2')
+    # when
+    urls = remaining_page_urls(people_page)
+    # then
+    assert urls == [f'{TEST_URL}?page=2', f'{TEST_URL}?page=3']
+
+
+def test_remaining_page_urls_last_page():
+    # given
+    people_page = create_people_page()
+    # when
+    urls = remaining_page_urls(people_page)
+    # then
+    assert urls == []
+
+
+def test_remaining_page_urls_without_page_number():
+    # given
+    people_page = create_people_page(count=5, next=f'{TEST_URL}?cursor=abc')
+    # when
+    urls = remaining_page_urls(people_page)
+    # then
+    assert urls is None
+
+
+def test_people_table_queries_pages_concurrently(test_client):
+    # given
+    people_table = PeopleTable(
+        client=test_client,
+        initial_url=TEST_URL,
+        max_workers=4
+    )
+    pages = {
+        TEST_URL: create_people_page(count=6, next=f'{TEST_URL}?page=2'),
+        f'{TEST_URL}?page=2': create_people_page(results=[
+            {"name": "R2-D2", "height": "96", "mass": "32"},
+            {"name": "Darth Vader", "height": "202", "mass": "136"},
+        ]),
+        f'{TEST_URL}?page=3': create_people_page(results=[
+            {"name": "Leia Organa", "height": "150", "mass": "49"},
+            {"name": "Owen Lars", "height": "178", "mass": "120"},
+        ]),
+    }
+    with patch.object(test_client, 'get') as get_mock:
+        get_mock.side_effect = pages.__getitem__
+        # when
+        data = petl.data(people_table)
+        # then
+        assert [row[0] for row in data] == [
+            'Luke Skywalker', 'C-3PO', 'R2-D2', 'Darth Vader', 'Leia Organa',
+            'Owen Lars',
+        ]
+        assert get_mock.call_count == 3
+
+
+def test_people_table_reports_progress(test_client):
+    # given
+    progress_mock = Mock()
+    people_table = PeopleTable(
+        client=test_client,
+        initial_url=TEST_URL,
+        progress=progress_mock
+    )
+    first_page = create_people_page(count=4, next=f'{TEST_URL}?page=2')
+    second_page = create_people_page()
+    with patch.object(test_client, 'get') as get_mock:
+        get_mock.side_effect = [first_page, second_page]
+        # when
+        petl.nrows(people_table)
+        # then
+        progress_mock.assert_has_calls([call(1, 2), call(2, 2)])
+
+
+def create_columnar_table(rows):
+    file = io.BytesIO()
+    write_columns(petl.wrap(rows), file)
+    return ColumnarTable(ColumnarFile(file.getvalue()))
+
+
+INCREMENTAL_TABLE = petl.wrap([
+    ('name', 'url', 'edited'),
+    ('Luke Skywalker', 'people/1/', '2014-12-20'),
+    ('C-3PO', 'people/2/', '2014-12-21'),
+    ('Leia Organa', 'people/5/', '2014-12-22'),
+])
+
+PREVIOUS_ROWS = {
+    'people/2/': ('2014-12-01', 0),
+    'people/1/': ('2014-12-20', 1),
+}
+
+
+def transform_incremental_table(extracted_table):
+    return petl.cutout(petl.rename(extracted_table, 'edited', 'date'), 'url')
+
+
+def test_incremental_table_transforms_changed_records_only():
+    # given
+    previous_table = create_columnar_table([
+        ('name', 'date'),
+        ('C3PO', '2014-12-01'),
+        ('Luke', '2014-12-20'),
+    ])
+    transformed_tables = []
+
+    def transform(extracted_table):
+        transformed_table = transform_incremental_table(extracted_table)
+        transformed_tables.append(transformed_table)
+        return transformed_table
+
+    records = []
+    # when
+    rows = list(IncrementalTable(
+        INCREMENTAL_TABLE,
+        transform,
+        previous=PREVIOUS_ROWS,
+        previous_table=previous_table,
+        records=records,
+    ))
+    # then
+    assert rows == [
+        ('name', 'date'),
+        ('Luke', '2014-12-20'),
+        ('C-3PO', '2014-12-21'),
+        ('Leia Organa', '2014-12-22'),
+    ]
+    assert list(transformed_tables[-1]) == [
+        ('name', 'date'),
+        ('C-3PO', '2014-12-21'),
+        ('Leia Organa', '2014-12-22'),
+    ]
+    assert records == [
+        ('people/1/', '2014-12-20'),
+        ('people/2/', '2014-12-21'),
+        ('people/5/', '2014-12-22'),
+    ]
+
+
+def test_incremental_table_ignores_previous_rows_with_other_header():
+    # given
+    previous_table = create_columnar_table([
+        ('name', 'height'),
+        ('C3PO', '167'),
+        ('Luke', '172'),
+    ])
+    # when
+    rows = list(IncrementalTable(
+        INCREMENTAL_TABLE,
+        transform_incremental_table,
+        previous=PREVIOUS_ROWS,
+        previous_table=previous_table,
+    ))
+    # then
+    assert rows == [
+        ('name', 'date'),
+        ('Luke Skywalker', '2014-12-20'),
+        ('C-3PO', '2014-12-21'),
+        ('Leia Organa', '2014-12-22'),
+    ]
@@ -1,16 +1,24 @@
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 
 import petl
 import pytest
+import responses
+from django.core.cache import caches
 
 from starwars.client import StarWarsClient
+from starwars.columnar import ColumnarTable
+from starwars.metrics import Timings
+from starwars.tables import PeopleTable, SortedHeadTable
 from starwars.transforms import (
-    add_date_for_edited,
-    convert_homeworld_to_name,
-    cutout_people_columns,
+    PLANET_CACHE_ALIAS,
     datetime_string_to_date_string,
     get_planet_name,
-    limit_rows, sort_django_style,
+    get_planet_names,
+    limit_rows,
+    normalize_loaded_people_table_parameters,
+    planet_cache_key,
+    skip_rows,
+    sort_django_style,
     transform_extracted_people_table,
     transform_loaded_people_table,
     value_counts_without_frequency,
@@ -35,7 +43,15 @@ class DummyTable(petl.Table):
 
 @pytest.fixture
 def client_mock():
-    return Mock(spec_set=StarWarsClient)
+    return MagicMock(spec_set=StarWarsClient)
+
+
+@pytest.fixture(autouse=True)
+def planet_cache():
+    cache = caches[PLANET_CACHE_ALIAS]
+    cache.clear()
+    yield cache
+    cache.clear()
 
 
 def test_datetime_string_to_date_string_when_none():
@@ -65,6 +81,34 @@ def test_datetime_string_to_date_string(datetime_string, expected_date_string):
     assert date_string == expected_date_string
 
 
+@pytest.mark.parametrize('datetime_string', [
+    '2014-12-20T21:17:56.891000Z',
+    '2014-12-20T21:17:56Z',
+    '2014-12-20T21:17',
+    '2014-12-20',
+])
+@patch('dateutil.parser.isoparse')
+def test_datetime_string_to_date_string_common_shape(
+    isoparse_mock,
+    datetime_string
+):
+    # given
+    datetime_string_to_date_string.cache_clear()
+    # when
+    date_string = datetime_string_to_date_string(datetime_string)
+    # then
+    assert date_string == '2014-12-20'
+    isoparse_mock.assert_not_called()
+
+
+def test_datetime_string_to_date_string_invalid_date():
+    # given
+    datetime_string_to_date_string.cache_clear()
+    # when, then
+    with pytest.raises(ValueError):
+        datetime_string_to_date_string('2014-02-30T21:17:56Z')
+
+
 def test_get_planet_name_no_name(client_mock):
     # given
     client_mock.get.return_value = {}
@@ -84,43 +128,76 @@ def test_get_planet_name(client_mock):
     assert planet_name == expected_planet_name
 
 
-def test_add_date_for_edited():
+def test_get_planet_name_is_cached_across_clients():
     # given
-    expected_date = '2021-06-12'
-    table = DummyTable()
+    first_client_mock = Mock(spec_set=StarWarsClient)
+    first_client_mock.get.return_value = {'name': 'Tatooine'}
+    second_client_mock = Mock(spec_set=StarWarsClient)
+    get_planet_name(client=first_client_mock, url='https://swapi/')
     # when
-    transformed_table = add_date_for_edited(table)
+    planet_name = get_planet_name(
+        client=second_client_mock,
+        url='https://swapi/'
+    )
     # then
-    assert 'date' in petl.header(transformed_table)
-    first_row = next(iter(petl.dicts(transformed_table)))
-    assert first_row['date'] == expected_date
+    assert planet_name == 'Tatooine'
+    second_client_mock.get.assert_not_called()
 
 
-@patch('starwars.transforms.get_planet_name')
-def test_convert_homeworld_to_name(get_planet_name_mock, client_mock):
+def test_get_planet_names_reads_cached_names(client_mock, planet_cache):
     # given
-    planet_name = 'Tatooine'
-    get_planet_name_mock.return_value = planet_name
-    table = DummyTable()
+    planet_cache.set(planet_cache_key('https://swapi/planets/1/'), 'Tatooine')
+    client_mock.get.return_value = {'name': 'Alderaan'}
     # when
-    transformed_table = convert_homeworld_to_name(table, client_mock)
+    planet_names = get_planet_names(
+        client=client_mock,
+        urls=['https://swapi/planets/1/', 'https://swapi/planets/2/'],
+    )
     # then
-    assert 'homeworld' in petl.header(transformed_table)
-    first_row = next(iter(petl.dicts(transformed_table)))
-    assert first_row['homeworld'] == planet_name
+    assert planet_names == {
+        'https://swapi/planets/1/': 'Tatooine',
+        'https://swapi/planets/2/': 'Alderaan',
+    }
+    client_mock.get.assert_called_once_with('https://swapi/planets/2/')
 
 
-def test_cutout_people_columns():
+def test_get_planet_names_counts_cache_hits(client_mock, planet_cache):
     # given
-    expected_cutout_columns = [
-        'starships', 'edited', 'created', 'vehicles', 'films', 'species', 'url'
-    ]
-    table = DummyTable()
+    planet_cache.set(planet_cache_key('https://swapi/planets/1/'), 'Tatooine')
+    client_mock.get.return_value = {'name': 'Alderaan'}
+    timings = Timings()
     # when
-    transformed_table = cutout_people_columns(table)
+    get_planet_names(
+        client=client_mock,
+        urls=['https://swapi/planets/1/', 'https://swapi/planets/2/'],
+        timings=timings,
+    )
     # then
-    header = petl.header(transformed_table)
-    assert all(col not in header for col in expected_cutout_columns)
+    assert timings.as_dict()['counts'] == {
+        'planet_cache_hits': 1,
+        'planet_cache_misses': 1,
+    }
+
+
+def test_get_planet_names(client_mock):
+    # given
+    planets = {
+        'https://swapi/planets/1/': {'name': 'Tatooine'},
+        'https://swapi/planets/2/': {'name': 'Alderaan'},
+    }
+    client_mock.get.side_effect = planets.__getitem__
+    # when
+    planet_names = get_planet_names(
+        client=client_mock,
+        urls=[*planets, *planets],
+        max_workers=2
+    )
+    # then
+    assert planet_names == {
+        'https://swapi/planets/1/': 'Tatooine',
+        'https://swapi/planets/2/': 'Alderaan',
+    }
+    assert client_mock.get.call_count == 2
 
 
 def test_value_counts_without_frequency_no_fields():
@@ -193,27 +270,142 @@ def test_limit_rows():
     assert len(petl.data(transformed_table)) == 1
 
 
-@patch('starwars.transforms.cutout_people_columns')
-@patch('starwars.transforms.convert_homeworld_to_name')
-@patch('starwars.transforms.add_date_for_edited')
-def test_transform_extracted_people_table(
-    add_date_for_edited_mock,
-    convert_homeworld_to_name_mock,
-    cutout_people_columns_mock,
-    client_mock
+def test_skip_rows_no_offset():
+    # given
+    table = DummyTable()
+    # when
+    transformed_table = skip_rows(table, offset=0)
+    # then
+    assert transformed_table == table
+
+
+def test_skip_rows():
+    # given
+    table = DummyTable()
+    # when
+    transformed_table = skip_rows(table, offset=1)
+    # then
+    assert list(petl.data(transformed_table)) == list(petl.data(table))[1:]
+
+
+@pytest.mark.parametrize(
+    ('aggregate_by', 'order_by', 'expected_parameters'),
+    [
+        (None, None, ((), None)),
+        ([], '', ((), None)),
+        (['name', 'name', 'unknown'], None, (('name',), None)),
+        (['name'], '-count', (('name',), '-count')),
+        (['name'], 'url', (('name',), None)),
+        ([], '-url', ((), '-url')),
+        ([], 'count', ((), None)),
+    ]
+)
+def test_normalize_loaded_people_table_parameters(
+    aggregate_by,
+    order_by,
+    expected_parameters
 ):
+    # given
+    header = petl.header(DummyTable())
+    # when
+    parameters = normalize_loaded_people_table_parameters(
+        header,
+        aggregate_by=aggregate_by,
+        order_by=order_by,
+    )
+    # then
+    assert parameters == expected_parameters
+
+
+@patch('starwars.transforms.get_planet_names')
+def test_transform_extracted_people_table(get_planet_names_mock, client_mock):
     # given
     table = DummyTable()
-    add_date_for_edited_mock.return_value = table
-    convert_homeworld_to_name_mock.return_value = table
-    cutout_people_columns_mock.return_value = table
+    get_planet_names_mock.side_effect = lambda client, urls, **kwargs: {
+        url: url.rstrip('/').split('/')[-1] for url in urls
+    }
+    expected_rows = [
+        ('name', 'homeworld', 'date'),
+        ('Test 1', '1', '2021-06-12'),
+        ('Test 2', '2', '2021-06-12'),
+    ]
     # when
     transformed_table = transform_extracted_people_table(table, client_mock)
     # then
-    assert transformed_table == table
-    add_date_for_edited_mock.assert_called_once_with(table)
-    convert_homeworld_to_name_mock.assert_called_once_with(table, client_mock)
-    cutout_people_columns_mock.assert_called_once_with(table)
+    assert list(transformed_table) == expected_rows
+    get_planet_names_mock.assert_called_with(
+        client_mock,
+        {'http://swapi/api/planet/1/', 'http://swapi/api/planet/2/'},
+        max_workers=1,
+        timings=None
+    )
+
+
+@responses.activate
+def test_transform_extracted_people_table_keeps_client_open():
+    # given
+    responses.add(
+        responses.GET,
+        'http://swapi/api/people/',
+        json={
+            'count': 1,
+            'next': None,
+            'results': [
+                {'name': 'Luke', 'homeworld': 'http://swapi/api/planets/1/'},
+            ],
+        },
+    )
+    responses.add(
+        responses.GET,
+        'http://swapi/api/planets/1/',
+        json={'name': 'Tatooine'},
+    )
+    client = StarWarsClient()
+    table = PeopleTable(client, 'http://swapi/api/people/')
+    # when
+    transformed_table = transform_extracted_people_table(table, client)
+    # then
+    assert list(transformed_table) == [
+        ('name', 'homeworld', 'date'),
+        ('Luke', 'Tatooine', None),
+    ]
+
+
+@patch('starwars.transforms.get_planet_names')
+def test_transform_extracted_people_table_records_timings(
+    get_planet_names_mock,
+    client_mock
+):
+    # given
+    get_planet_names_mock.side_effect = lambda client, urls, **kwargs: {
+        url: url for url in urls
+    }
+    timings = Timings()
+    # when
+    petl.nrows(transform_extracted_people_table(
+        DummyTable(),
+        client_mock,
+        timings=timings,
+    ))
+    # then
+    assert set(timings.as_dict()['seconds']) == {'planets', 'transform'}
+    assert get_planet_names_mock.call_args.kwargs['timings'] is timings
+
+
+def test_transform_extracted_people_table_without_homeworld(client_mock):
+    # given
+    table = petl.wrap([
+        ('name', 'edited', 'url'),
+        ('Luke Skywalker', '2014-12-20T21:17:56.891000Z', 'people/1/'),
+    ])
+    # when
+    transformed_table = transform_extracted_people_table(table, client_mock)
+    # then
+    assert list(transformed_table) == [
+        ('name', 'date'),
+        ('Luke Skywalker', '2014-12-20'),
+    ]
+    client_mock.get.assert_not_called()
 
 
 @patch('starwars.transforms.limit_rows')
@@ -250,3 +442,61 @@ def test_transform_loaded_people_table(
         order_by=order_by
     )
     limit_rows_mock.assert_called_once_with(table, limit=limit)
+
+
+def test_value_counts_without_frequency_uses_columnar_index():
+    # given
+    table_mock = Mock(spec=ColumnarTable)
+    # when
+    transformed_table = value_counts_without_frequency(table_mock, ['name'])
+    # then
+    assert transformed_table == table_mock.value_counts.return_value
+    table_mock.value_counts.assert_called_once_with(['name'])
+
+
+@pytest.mark.parametrize('order_by', ['homeworld', '-homeworld'])
+@pytest.mark.parametrize('limit', [1, 2, 3, 5])
+def test_limit_rows_sorted_selects_top_rows(order_by, limit):
+    # given
+    table = petl.wrap([
+        ('name', 'homeworld'),
+        ('Luke Skywalker', 'Tatooine'),
+        ('Leia Organa', 'Alderaan'),
+        ('C-3PO', 'Tatooine'),
+        ('R2-D2', 'Naboo'),
+    ])
+    sorted_table = sort_django_style(table, order_by=order_by)
+    expected_rows = list(petl.head(sorted_table, limit))
+    # when
+    transformed_table = limit_rows(sorted_table, limit=limit)
+    # then
+    assert isinstance(transformed_table, SortedHeadTable)
+    assert list(transformed_table) == expected_rows
+
+
+@patch('starwars.transforms.SortedHeadTable', wraps=SortedHeadTable)
+def test_transform_loaded_people_table_selects_page_with_heap(
+    sorted_head_table_mock,
+):
+    # given
+    table = petl.wrap([
+        ('name', 'homeworld'),
+        ('Luke Skywalker', 'Tatooine'),
+        ('Leia Organa', 'Alderaan'),
+        ('C-3PO', 'Tatooine'),
+        ('R2-D2', 'Naboo'),
+    ])
+    # when
+    transformed_table = transform_loaded_people_table(
+        table,
+        order_by='-name',
+        limit=2,
+        offset=1,
+    )
+    # then
+    assert list(transformed_table) == [
+        ('name', 'homeworld'),
+        ('Luke Skywalker', 'Tatooine'),
+        ('Leia Organa', 'Alderaan'),
+    ]
+    assert sorted_head_table_mock.call_args.kwargs['limit'] == 3
@@ -0,0 +1,219 @@
+import html
+import io
+import json
+import re
+
+import pytest
+from django.core.files import File
+from django.urls import reverse
+
+from starwars.models import Dataset
+from starwars.services import save_dataset_file
+
+pytestmark = pytest.mark.django_db
+
+CSV_TABLE = (
+    b'name,homeworld\r\n'
+    b'Luke Skywalker,Tatooine\r\n'
+    b'Leia Organa,Alderaan\r\n'
+    b'C-3PO,Tatooine\r\n'
+)
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+@pytest.fixture(params=[True, False], ids=['columnar', 'csv'])
+def dataset(request):
+    dataset = Dataset(status=Dataset.Status.RUNNING)
+    save_dataset_file(dataset, File(io.BytesIO(CSV_TABLE)))
+    if not request.param:
+        dataset.columns.name = ''
+    dataset.save()
+    return dataset
+
+
+def details(client, dataset, **parameters):
+    url = reverse('details', kwargs={'dataset_uuid': dataset.uuid})
+    return client.get(url, parameters)
+
+
+def links(response):
+    return [
+        html.unescape(href)
+        for href in re.findall(r'href="([^"]*)"', response.content.decode())
+    ]
+
+
+def export(client, dataset, **parameters):
+    url = reverse('export', kwargs={'dataset_uuid': dataset.uuid})
+    return client.get(url, parameters)
+
+
+@pytest.mark.parametrize('offset, expected', [
+    (None, {
+        'data': [('C-3PO', 'Tatooine'), ('Leia Organa', 'Alderaan')],
+        'first_row': 1,
+        'last_row': 2,
+        'previous_offset': None,
+        'next_offset': 2,
+    }),
+    ('invalid', {
+        'data': [('C-3PO', 'Tatooine'), ('Leia Organa', 'Alderaan')],
+        'first_row': 1,
+        'last_row': 2,
+        'previous_offset': None,
+        'next_offset': 2,
+    }),
+    (1, {
+        'data': [('Leia Organa', 'Alderaan'), ('Luke Skywalker', 'Tatooine')],
+        'first_row': 2,
+        'last_row': 3,
+        'previous_offset': 0,
+        'next_offset': None,
+    }),
+    (2, {
+        'data': [('Luke Skywalker', 'Tatooine')],
+        'first_row': 3,
+        'last_row': 3,
+        'previous_offset': 0,
+        'next_offset': None,
+    }),
+    (10, {
+        'data': [],
+        'first_row': 11,
+        'last_row': 10,
+        'previous_offset': 8,
+        'next_offset': None,
+    }),
+])
+def test_details_paginates_by_offset(
+    client,
+    dataset,
+    settings,
+    offset,
+    expected,
+):
+    # given
+    settings.DATASET_DEFAULT_PER_PAGE = 2
+    parameters = {'order_by': 'name'}
+    if offset is not None:
+        parameters['offset'] = offset
+    # when
+    response = details(client, dataset, **parameters)
+    # then
+    assert response.status_code == 200
+    assert {key: response.context[key] for key in expected} == expected
+
+
+def test_details_paginates_aggregated_rows(client, dataset, settings):
+    # given
+    settings.DATASET_DEFAULT_PER_PAGE = 1
+    # when
+    response = details(
+        client,
+        dataset,
+        field='homeworld',
+        order_by='homeworld',
+        offset=1,
+    )
+    # then
+    assert response.context['header'] == ('homeworld', 'count')
+    assert response.context['data'] == [('Tatooine', 2)]
+    assert response.context['previous_offset'] == 0
+    assert response.context['next_offset'] is None
+
+
+def test_details_links_keep_offset_only_for_pages(client, dataset, settings):
+    # given
+    settings.DATASET_DEFAULT_PER_PAGE = 1
+    # when
+    response = details(client, dataset, order_by='name', offset=1)
+    # then
+    hrefs = [href for href in links(response) if '?' in href]
+    assert {href.split('?', 1)[1] for href in hrefs} == {
+        'order_by=name&offset=0',
+        'order_by=name&offset=2',
+        'order_by=-name',
+        'order_by=homeworld',
+        'order_by=name&field=name',
+        'order_by=name&field=homeworld',
+    }
+
+
+def test_export_streams_csv(client, dataset):
+    # when
+    response = export(client, dataset)
+    # then
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/csv'
+    assert response['Content-Disposition'] == (
+        f'attachment; filename="{dataset.uuid!s}.csv"'
+    )
+    assert b''.join(response.streaming_content) == CSV_TABLE
+
+
+def test_export_streams_ndjson(client, dataset):
+    # when
+    response = export(client, dataset, format='ndjson')
+    # then
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/x-ndjson'
+    assert response['Content-Disposition'] == (
+        f'attachment; filename="{dataset.uuid!s}.ndjson"'
+    )
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'name': 'Luke Skywalker', 'homeworld': 'Tatooine'},
+        {'name': 'Leia Organa', 'homeworld': 'Alderaan'},
+        {'name': 'C-3PO', 'homeworld': 'Tatooine'},
+    ]
+
+
+def test_export_rejects_unknown_format(client, dataset):
+    # when
+    response = export(client, dataset, format='xlsx')
+    # then
+    assert response.status_code == 400
+
+
+def test_export_limits_sorted_rows(client, dataset):
+    # when
+    response = export(client, dataset, order_by='-name', limit=2)
+    # then
+    assert b''.join(response.streaming_content) == (
+        b'name,homeworld\r\n'
+        b'Luke Skywalker,Tatooine\r\n'
+        b'Leia Organa,Alderaan\r\n'
+    )
+
+
+@pytest.mark.parametrize('limit', ['all', ''])
+def test_export_ignores_invalid_limit(client, dataset, limit):
+    # when
+    response = export(client, dataset, limit=limit)
+    # then
+    assert b''.join(response.streaming_content) == CSV_TABLE
+
+
+def test_export_aggregates_rows(client, dataset):
+    # when
+    response = export(client, dataset, field='homeworld', order_by='-count')
+    # then
+    assert b''.join(response.streaming_content) == (
+        b'homeworld,count\r\n'
+        b'Tatooine,2\r\n'
+        b'Alderaan,1\r\n'
+    )
+
+
+def test_export_requires_done_dataset(client):
+    # given
+    dataset = Dataset.objects.create(status=Dataset.Status.RUNNING)
+    # when
+    response = export(client, dataset)
+    # then
+    assert response.status_code == 404
@@ -1,17 +1,53 @@
+import contextlib
 import functools
-from typing import Iterable, Optional, Sequence
+import itertools
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import (
+    ContextManager,
+    Dict,
+    Iterable,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 import dateutil.parser
 import petl
+from petl.transform.sorts import SortView
+from django.core.cache import caches
 
 from starwars.client import StarWarsClient
+from starwars.columnar import ColumnarTable, ValueCountsTable
+from starwars.metrics import Timings
+from starwars.tables import SortedHeadTable
 
+PLANET_CACHE_ALIAS = 'planets'
 
+PEOPLE_CUTOUT_COLUMNS = (
+    'starships', 'edited', 'created', 'vehicles', 'films', 'species', 'url'
+)
+
+_MISSING = object()
+
+_ISO_DATETIME_PATTERN = re.compile(
+    r'(\d{4}-\d{2}-\d{2})'
+    r'(?:T(?:[01]\d|2[0-3]):[0-5]\d(?::[0-5]\d(?:\.\d{1,6})?)?'
+    r'(?:Z|[+-]\d{2}:\d{2})?)?'
+)
+
+
+@functools.lru_cache(maxsize=4096)
 def datetime_string_to_date_string(
     datetime_string: Optional[str]
 ) -> Optional[str]:
     """Convert string with ISO datetime to string with ISO date.
 
+    The common ``YYYY-MM-DDTHH:MM:SS.ffffffZ`` shape is handled by taking
+    its (validated) date part, and other strings are parsed with dateutil.
+    Results are memoized, since many people share timestamps.
+
     Args:
         datetime_string: String with ISO datetime.
 
@@ -21,75 +57,206 @@ def datetime_string_to_date_string(
     """
     if datetime_string is None:
         return None
+    match = _ISO_DATETIME_PATTERN.fullmatch(datetime_string)
+    if match is not None:
+        try:
+            return date.fromisoformat(match.group(1)).isoformat()
+        except ValueError:
+            pass
     date_time = dateutil.parser.isoparse(datetime_string)
     return date_time.date().isoformat()
 
 
-@functools.lru_cache(maxsize=100)
-def get_planet_name(client: StarWarsClient, url: str) -> str:
-    """Get planet name from planet URL.
+def planet_cache_key(url: str) -> str:
+    """Get key of the planet name in the planets cache.
 
     Args:
-        client: Star Wars API client to use.
         url: URL of the planet.
 
     Returns:
-        str: Name of the planet.
+        Cache key for the planet name.
 
     """
-    planet = client.get(url)
-    return planet.get('name', None)
+    return f'planet-name:{url}'
 
 
-def add_date_for_edited(table: petl.Table) -> petl.Table:
-    """Add date field to table, based on ``edited`` field.
+def get_planet_name(client: StarWarsClient, url: str) -> str:
+    """Get planet name from planet URL.
+
+    Names are stored in the ``planets`` cache, keyed by the URL only, so they
+    are reused by all clients, fetches and worker processes.
 
     Args:
-        table: ETL table to add the field to.
+        client: Star Wars API client to use.
+        url: URL of the planet.
 
     Returns:
-        ETL table with the date field.
+        str: Name of the planet.
 
     """
-    return petl.addfield(
-        table,
-        'date',
-        lambda row: datetime_string_to_date_string(row.get('edited', None)),
-        missing=None,
-    )
-
-
-def convert_homeworld_to_name(table: petl.Table, client: StarWarsClient) -> petl.Table:
-    """Converts homeworld URL field to homeworld name.
+    cache = caches[PLANET_CACHE_ALIAS]
+    key = planet_cache_key(url)
+    name = cache.get(key, _MISSING)
+    if name is _MISSING:
+        planet = client.get(url)
+        name = planet.get('name', None)
+        cache.set(key, name)
+    return name
+
+
+def get_planet_names(
+    client: StarWarsClient,
+    urls: Iterable[str],
+    max_workers: int = 1,
+    timings: Timings = None
+) -> Dict[str, str]:
+    """Get names of multiple planets at once.
+
+    Names already present in the planets cache are read at once, and
+    the remaining planets are fetched concurrently by a pool of
+    ``max_workers`` threads.
 
     Args:
-        table: ETL table to convert the field in.
-        client: Star Wars API client to use for planet fetching.
+        client: Star Wars API client to use.
+        urls: URLs of the planets.
+        max_workers: Maximum number of planets fetched at the same time.
+        timings: Timings to count ``planet_cache_hits`` and
+            ``planet_cache_misses`` in.
 
     Returns:
-        ETL table with converted homeworld field.
+        Mapping of planet URLs to planet names.
 
     """
-    return petl.convert(
-        table,
-        'homeworld',
-        lambda value: get_planet_name(client, value)
+    urls = list(dict.fromkeys(urls))
+    cached = caches[PLANET_CACHE_ALIAS].get_many(
+        [planet_cache_key(url) for url in urls]
     )
-
-
-def cutout_people_columns(table: petl.Table) -> petl.Table:
-    """Cutout unnecessary columns from people table.
+    planet_names = {
+        url: cached[planet_cache_key(url)]
+        for url in urls
+        if planet_cache_key(url) in cached
+    }
+    urls = [url for url in urls if url not in planet_names]
+    if timings is not None:
+        timings.count('planet_cache_hits', len(planet_names))
+        timings.count('planet_cache_misses', len(urls))
+    if max_workers <= 1 or len(urls) <= 1:
+        names = [get_planet_name(client, url) for url in urls]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            names = list(executor.map(
+                lambda url: get_planet_name(client, url),
+                urls
+            ))
+    planet_names.update(zip(urls, names))
+    return planet_names
+
+
+class TransformedPeopleTable(petl.Table):
+    """ETL table transforming people table extracted from Star Wars API.
+
+    It adds the ``date`` field based on the ``edited`` field, converts
+    homeworld URLs to planet names and cuts out ``PEOPLE_CUTOUT_COLUMNS``
+    in a single pass: the output header and column indices are computed
+    once, and each output row is built straight from the source row, without
+    intermediate rows or records. Distinct homeworlds are resolved in batches
+    of rows, and the client is kept open for the whole iteration.
 
     Args:
-        table: ETL table to cutout the columns from,
-
-    Returns:
-        ETL table without the unnecessary columns.
+        table: ETL table to transform.
+        client: Star Wars API client to use for getting planet names.
+        max_workers: Maximum number of planets fetched at the same time.
+        batch_size: Maximum number of rows in a batch.
+        timings: Timings to add the time spent resolving homeworlds (as
+            the ``planets`` stage) and transforming rows (as
+            the ``transform`` stage) to.
 
     """
-    return petl.cutout(table, *[
-        'starships', 'edited', 'created', 'vehicles', 'films', 'species', 'url'
-    ])
+    def __init__(
+        self,
+        table: petl.Table,
+        client: StarWarsClient,
+        max_workers: int = 1,
+        batch_size: int = 1000,
+        timings: Timings = None
+    ):
+        self.table = table
+        self.client = client
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.timings = timings
+
+    def __iter__(self):
+        with self.client:
+            yield from self._iter_transformed()
+
+    def _iter_transformed(self):
+        it = iter(self.table)
+        try:
+            header = tuple(next(it))
+        except StopIteration:
+            return
+        indices = [
+            index for index, field in enumerate(header)
+            if field not in PEOPLE_CUTOUT_COLUMNS
+        ]
+        yield (*(header[index] for index in indices), 'date')
+        homeworld_index = self._index(header, 'homeworld')
+        edited_index = self._index(header, 'edited')
+        convert_homeworld = homeworld_index in indices
+        if convert_homeworld:
+            output_homeworld_index = indices.index(homeworld_index)
+        width = len(header)
+        while True:
+            rows = list(itertools.islice(it, self.batch_size))
+            if not rows:
+                break
+            planet_names = {}
+            if convert_homeworld:
+                with self._time('planets'):
+                    planet_names = get_planet_names(
+                        self.client,
+                        {
+                            row[homeworld_index] for row in rows
+                            if len(row) > homeworld_index
+                        },
+                        max_workers=self.max_workers,
+                        timings=self.timings,
+                    )
+            # Rows of a batch are transformed before any of them is returned,
+            # so the transform is timed without the consumer of the rows.
+            outputs = []
+            with self._time('transform'):
+                for row in rows:
+                    if len(row) >= width:
+                        output = [row[index] for index in indices]
+                    else:
+                        output = [
+                            row[index] if index < len(row) else None
+                            for index in indices
+                        ]
+                    if convert_homeworld and len(row) > homeworld_index:
+                        output[output_homeworld_index] = planet_names[
+                            row[homeworld_index]
+                        ]
+                    edited = None
+                    if edited_index is not None and len(row) > edited_index:
+                        edited = row[edited_index]
+                    output.append(datetime_string_to_date_string(edited))
+                    outputs.append(tuple(output))
+            yield from outputs
+
+    def _time(self, stage: str) -> ContextManager:
+        if self.timings is None:
+            return contextlib.nullcontext()
+        return self.timings.time(stage)
+
+    @staticmethod
+    def _index(header: tuple, field: str) -> Optional[int]:
+        try:
+            return header.index(field)
+        except ValueError:
+            return None
 
 
 def value_counts_without_frequency(
@@ -98,6 +265,11 @@ def value_counts_without_frequency(
 ) -> petl.Table:
     """Aggregate table by given fields and add column with value counts.
 
+    Only the columns to aggregate by are read: tables read from columnar
+    files are aggregated with their value count indexes, without scanning
+    the rows or decoding other columns, and other tables are cut to those
+    columns before their rows are counted.
+
     Args:
         table: ETL table to aggregate.
         fields: Names of the fields to aggregate the table by.
@@ -108,8 +280,10 @@ def value_counts_without_frequency(
     """
     if not fields:
         return table
+    if isinstance(table, ColumnarTable):
+        return table.value_counts(fields)
     return petl.cutout(
-        petl.valuecounts(table, *fields),
+        petl.valuecounts(petl.cut(table, *fields), *fields),
         'frequency'
     )
 
@@ -119,7 +293,9 @@ def sort_django_style(table: petl.Table, order_by: Optional[str]) -> petl.Table:
 
     When ``order_by`` is a column name, the rows are sorted in ascending order.
     When ``order_by`` is a column name with a ``-`` before it, the rows are
-    sorted in descending order.
+    sorted in descending order. Columnar tables (and their value counts) are
+    sorted with their sort order indexes, so numeric columns are sorted by
+    numbers instead of strings.
 
     Args:
          table: ETL table to sort.
@@ -137,12 +313,18 @@ def sort_django_style(table: petl.Table, order_by: Optional[str]) -> petl.Table:
         order_by = order_by[1:]
     if order_by not in petl.header(table):
         return table
+    if isinstance(table, (ColumnarTable, ValueCountsTable)):
+        return table.sort(order_by, reverse=reverse)
     return petl.sort(table, key=order_by, reverse=reverse)
 
 
 def limit_rows(table: petl.Table, limit: int = None) -> petl.Table:
     """Limit returned table rows to given value.
 
+    When the table is sorted, the first rows are selected with a bounded heap
+    instead of sorting the whole table. Columnar tables only read the first
+    rows of their (sorted) row order.
+
     Args:
         table: ETL table to limit.
         limit: Limit of number of returned rows when iterating over the table.
@@ -153,12 +335,74 @@ def limit_rows(table: petl.Table, limit: int = None) -> petl.Table:
     """
     if not limit:
         return table
+    if isinstance(table, ColumnarTable):
+        return table.slice(0, limit)
+    if isinstance(table, SortView) and table.key is not None:
+        return SortedHeadTable(
+            table.source,
+            key=table.key,
+            limit=limit,
+            reverse=table.reverse
+        )
     return petl.rowslice(table, limit)
 
 
+def skip_rows(table: petl.Table, offset: int = 0) -> petl.Table:
+    """Skip given number of first table rows.
+
+    Columnar tables skip the rows without reading them, so a page of rows
+    far from the start costs only that page.
+
+    Args:
+        table: ETL table to skip the rows of.
+        offset: Number of rows to skip.
+
+    Returns:
+        ETL table without the first ``offset`` rows.
+
+    """
+    if not offset:
+        return table
+    if isinstance(table, ColumnarTable):
+        return table.slice(offset)
+    return petl.rowslice(table, offset, None)
+
+
+def normalize_loaded_people_table_parameters(
+    header: Sequence[str],
+    aggregate_by: Iterable[str] = None,
+    order_by: str = None
+) -> Tuple[Tuple[str, ...], Optional[str]]:
+    """Normalize parameters of ``transform_loaded_people_table()``.
+
+    Unknown and repeated aggregation fields are dropped, and ordering by
+    a field that is not in the transformed table is dropped, as it would be
+    ignored anyway. Parameters resulting in the same table are then equal.
+
+    Args:
+        header: Header of the loaded table.
+        aggregate_by: Field names to aggregate by.
+        order_by: Django-style field name ordering value.
+
+    Returns:
+        Tuple of normalized aggregation fields and ordering value.
+
+    """
+    fields = tuple(
+        field for field in dict.fromkeys(aggregate_by or ())
+        if field in header
+    )
+    transformed_header = (*fields, 'count') if fields else tuple(header)
+    if order_by and order_by.lstrip('-') not in transformed_header:
+        order_by = None
+    return fields, order_by or None
+
+
 def transform_extracted_people_table(
     table: petl.Table,
-    client: StarWarsClient
+    client: StarWarsClient,
+    max_workers: int = 1,
+    timings: Timings = None
 ) -> petl.Table:
     """Transform people table extracted from Star Wars API.
 
@@ -166,19 +410,25 @@ def transform_extracted_people_table(
     * Convert homeworld URL to planet name.
     * Cutout unnecessary columns.
 
+    All transformations are done in a single pass, see
+    ``TransformedPeopleTable``.
+
     Args:
         table: ETL table to transform.
         client: Star Wars API client to use for getting planet names.
+        max_workers: Maximum number of planets fetched at the same time.
+        timings: Timings to add time spent in the transform to, see
+            ``TransformedPeopleTable``.
 
     Returns:
         Transformed ETL table.
 
     """
-    return cutout_people_columns(
-        convert_homeworld_to_name(
-            add_date_for_edited(table),
-            client
-        )
+    return TransformedPeopleTable(
+        table,
+        client,
+        max_workers=max_workers,
+        timings=timings,
     )
 
 
@@ -186,7 +436,8 @@ def transform_loaded_people_table(
     table: petl.Table,
     aggregate_by: Iterable[str] = None,
     order_by: str = None,
-    limit: int = None
+    limit: int = None,
+    offset: int = 0
 ) -> petl.Table:
     """Transform people table loaded from a file.
 
@@ -194,6 +445,7 @@ def transform_loaded_people_table(
 
     * Aggregate table by values of given columns and add a column with counts.
     * Sort table by given field (Django-style).
+    * Skip given number of first rows.
     * Limit number of returned rows on table iteration.
 
     Args:
@@ -205,15 +457,21 @@ def transform_loaded_people_table(
             is applied when ``None``.
         limit: Maximum number of rows that will be returned when iterating over
             the table. No limit when ``None``.
+        offset: Number of first rows to skip.
 
     Returns:
         Transformed ETL table
 
     """
-    return limit_rows(
-        sort_django_style(
-            value_counts_without_frequency(table, fields=aggregate_by),
-            order_by=order_by
+    # Rows are limited before they are skipped, so the first rows of a sorted
+    # table are still selected without sorting the whole table.
+    return skip_rows(
+        limit_rows(
+            sort_django_style(
+                value_counts_without_frequency(table, fields=aggregate_by),
+                order_by=order_by
+            ),
+            limit=offset + limit if limit and offset else limit
         ),
-        limit=limit
+        offset=offset
     )
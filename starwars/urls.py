@@ -5,5 +5,7 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('dataset/<uuid:dataset_uuid>/', views.details, name='details'),
+    path('dataset/<uuid:dataset_uuid>/export/', views.export, name='export'),
     path('fetch/', views.fetch, name='fetch'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -1,68 +1,138 @@
 import uuid
-from datetime import datetime
 
 import petl
 from django.conf import settings
 from django.contrib import messages
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
-from django.urls import reverse
-from django.utils.safestring import mark_safe
 
-from starwars.client import StarWarsClient
 from starwars.models import Dataset
-from starwars.services import fetch_dataset
-from starwars.transforms import transform_loaded_people_table
+from starwars.services import (
+    EXPORT_FORMATS,
+    collect_metrics,
+    fail_stale_fetch_jobs,
+    get_transformed_rows,
+    load_dataset_table,
+    submit_fetch_job,
+)
+from starwars.transforms import (
+    normalize_loaded_people_table_parameters,
+    transform_loaded_people_table,
+)
 
 
 def index(request):
-    datasets = Dataset.objects.only('uuid', 'date').all()
-    return render(request, 'index.html', {'datasets': datasets})
+    fail_stale_fetch_jobs()
+    datasets = Dataset.objects.only(
+        'uuid', 'date', 'status', 'pages_done', 'pages_total', 'duration'
+    ).all()
+    in_progress = any(
+        dataset.status in (Dataset.Status.PENDING, Dataset.Status.RUNNING)
+        for dataset in datasets
+    )
+    return render(request, 'index.html', {
+        'datasets': datasets,
+        'in_progress': in_progress,
+    })
 
 
 def details(request, dataset_uuid: uuid.UUID):
-    dataset = get_object_or_404(Dataset, uuid=dataset_uuid)
+    dataset = get_object_or_404(
+        Dataset,
+        uuid=dataset_uuid,
+        status=Dataset.Status.DONE
+    )
 
     fields = request.GET.getlist('field', [])
     order_by = request.GET.get('order_by', None)
     limit = request.GET.get('limit', settings.DATASET_DEFAULT_PER_PAGE)
     try:
-        limit = int(limit)
+        limit = max(1, int(limit))
     except ValueError:
         limit = settings.DATASET_DEFAULT_PER_PAGE
-    next_limit = limit + settings.DATASET_DEFAULT_PER_PAGE
+    offset = request.GET.get('offset', 0)
+    try:
+        offset = max(0, int(offset))
+    except ValueError:
+        offset = 0
 
-    table = petl.fromcsv(dataset.file)
-    transformed_table = transform_loaded_people_table(
+    table = load_dataset_table(dataset)
+    header, rows = get_transformed_rows(
+        dataset,
         table,
         aggregate_by=fields,
         order_by=order_by,
-        limit=limit
+        limit=limit + 1,
+        offset=offset,
     )
+    data = rows[:limit]
     return render(request, 'details.html', {
         'dataset': dataset,
         'available_fields': petl.header(table),
         'fields': fields,
-        'header': petl.header(transformed_table),
-        'data': petl.data(transformed_table),
-        'next_limit': next_limit
+        'header': header,
+        'data': data,
+        'first_row': offset + 1,
+        'last_row': offset + len(data),
+        'previous_offset': max(0, offset - limit) if offset else None,
+        'next_offset': offset + limit if len(rows) > limit else None,
     })
 
 
-def fetch(request):
-    client = StarWarsClient()
+def export(request, dataset_uuid: uuid.UUID):
+    dataset = get_object_or_404(
+        Dataset,
+        uuid=dataset_uuid,
+        status=Dataset.Status.DONE
+    )
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f'Unknown format: {export_format}')
+    content_type, iter_lines = EXPORT_FORMATS[export_format]
+    limit = request.GET.get('limit', None)
     try:
-        time_start = datetime.now()
-        dataset = fetch_dataset(client)
-        time_end = datetime.now()
-
-        fetch_time = (time_end - time_start).total_seconds()
-
-        dataset_url = reverse("details", args=(dataset.uuid,))
-        messages.success(request, mark_safe(
-            f'Fetched dataset <a href="{dataset_url}">{dataset.uuid!s}</a> '
-            f'in <b>{round(fetch_time, 2)}s</b>'
-        ))
-    except Exception as e:
-        messages.error(request, f'Could not fetch dataset: {e!s}')
+        limit = max(1, int(limit)) if limit is not None else None
+    except ValueError:
+        limit = None
+
+    table = load_dataset_table(dataset)
+    aggregate_by, order_by = normalize_loaded_people_table_parameters(
+        petl.header(table),
+        aggregate_by=request.GET.getlist('field', []),
+        order_by=request.GET.get('order_by', None),
+    )
+    transformed_table = transform_loaded_people_table(
+        table,
+        aggregate_by=aggregate_by,
+        order_by=order_by,
+        limit=limit,
+    )
+    response = StreamingHttpResponse(
+        iter_lines(transformed_table),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{dataset.uuid!s}.{export_format}"'
+    )
+    return response
+
+
+def fetch(request):
+    dataset = submit_fetch_job()
+    messages.success(
+        request,
+        f'Fetching dataset {dataset.uuid!s} has been scheduled'
+    )
     return redirect('index')
 
+
+def metrics(request):
+    return HttpResponse(
+        collect_metrics().render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -119,6 +119,35 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_ROOT = BASE_DIR.joinpath('media')
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Planet names are shared by all workers and all fetches.
+    'planets': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR.joinpath('cache', 'planets'),
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    # Aggregated rows of datasets, which never change once fetched. Rows are
+    # stored in chunks of 1000, so memory of each process is bounded by
+    # MAX_ENTRIES chunks (see also DATASET_CACHE_MAX_ROWS).
+    'datasets': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'datasets',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100,
+        },
+    },
+}
+
 MESSAGE_TAGS = {
     messages.DEBUG: 'alert-dark',
     messages.INFO: 'alert-info',
@@ -129,3 +158,24 @@ MESSAGE_TAGS = {
 
 DATASET_FETCH_URL = 'https://swapi.dev/api/people/'
 DATASET_DEFAULT_PER_PAGE = 10
+DATASET_FETCH_CONCURRENCY = 4
+DATASET_PLANET_FETCH_CONCURRENCY = 8
+DATASET_JOB_POLL_INTERVAL = 1
+DATASET_JOB_TIMEOUT = 60 * 10
+DATASET_INCREMENTAL_FETCH = True
+DATASET_CACHE_MAX_ROWS = 20000
+DATASET_COMPRESSION = None
+
+SWAPI_RESPONSE_CACHE_DIR = BASE_DIR.joinpath('cache', 'responses')
+SWAPI_RESPONSE_CACHE_MAX_ENTRIES = 1000
+SWAPI_POOL_CONNECTIONS = 10
+SWAPI_POOL_MAXSIZE = 16
+SWAPI_POOL_BLOCK = True
+SWAPI_MAX_RETRIES = 3
+SWAPI_KEEP_ALIVE = True
+SWAPI_CONNECT_TIMEOUT = 5
+SWAPI_READ_TIMEOUT = 30
+SWAPI_RATE_LIMIT = 10
+SWAPI_RATE_LIMIT_BURST = 10
+SWAPI_RATE_LIMIT_RETRIES = 5
+SWAPI_MAX_CONCURRENCY = 16